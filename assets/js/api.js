@@ -12,16 +12,17 @@ class ApiClient {
     }
 
     async request(endpoint, options = {}) {
+        const { raw, ...fetchOptions } = options;
         const url = `${this.baseUrl}${endpoint}`;
         const headers = {
             'Content-Type': 'application/json',
             ...(this.token && { 'Authorization': `Bearer ${this.token}` }),
-            ...options.headers
+            ...fetchOptions.headers
         };
 
         try {
             const response = await fetch(url, {
-                ...options,
+                ...fetchOptions,
                 headers
             });
 
@@ -36,10 +37,12 @@ class ApiClient {
 
             if (!response.ok) {
                 const error = typeof data === 'object' ? data : { detail: data };
-                throw new Error(error.detail || `HTTP ${response.status}`);
+                const err = new Error(error.detail || `HTTP ${response.status}`);
+                err.status = response.status;
+                throw err;
             }
 
-            return data;
+            return raw ? { data, headers: response.headers } : data;
         } catch (error) {
             if (error.name === 'TypeError' && error.message === 'Failed to fetch') {
                 throw new Error('Не удалось подключиться к серверу');
@@ -52,6 +55,31 @@ class ApiClient {
         return this.request(endpoint, { method: 'GET' });
     }
 
+    // Paginated list endpoints return an array plus cursor headers
+    async getPage(endpoint, cursor = null) {
+        const separator = endpoint.includes('?') ? '&' : '?';
+        const path = cursor ? `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}` : endpoint;
+        const { data, headers } = await this.request(path, { method: 'GET', raw: true });
+        const total = headers.get('X-Total-Count');
+        return {
+            items: data,
+            nextCursor: headers.get('X-Next-Cursor'),
+            total: total === null ? null : Number(total),
+        };
+    }
+
+    // Follow cursors until the whole list is loaded (for short lists)
+    async getAll(endpoint) {
+        const items = [];
+        let cursor = null;
+        do {
+            const page = await this.getPage(endpoint, cursor);
+            items.push(...page.items);
+            cursor = page.nextCursor;
+        } while (cursor);
+        return items;
+    }
+
     post(endpoint, data) {
         return this.request(endpoint, {
             method: 'POST',
@@ -66,6 +94,13 @@ class ApiClient {
         });
     }
 
+    patch(endpoint, data) {
+        return this.request(endpoint, {
+            method: 'PATCH',
+            body: JSON.stringify(data)
+        });
+    }
+
     delete(endpoint) {
         return this.request(endpoint, { method: 'DELETE' });
     }
@@ -10,9 +10,9 @@ let activeTab = 'users';
 async function fetchData() {
     try {
         if (activeTab === 'users') {
-            users = await api.get('/api/admin/users');
+            users = await api.getAll('/api/admin/users');
         } else if (activeTab === 'reset-requests') {
-            resetRequests = await api.get('/api/admin/reset-requests');
+            resetRequests = await api.getAll('/api/admin/reset-requests');
         }
         renderContent();
     } catch (err) {
@@ -242,7 +242,7 @@ export function mount() {
     fetchData();
 
     // Also fetch reset requests for badge
-    api.get('/api/admin/reset-requests').then(data => {
+    api.getAll('/api/admin/reset-requests').then(data => {
         resetRequests = data;
         updateResetBadge();
     }).catch(() => {});
@@ -1,11 +1,13 @@
 // Chat Page with WebSocket
 import { auth } from '../auth.js';
-import { API_URL } from '../api.js';
+import { api, API_URL } from '../api.js';
 import { formatTime, escapeHtml } from '../utils.js';
 
 let ws = null;
 let messages = [];
 let connected = false;
+let hasMore = false;
+let loadingOlder = false;
 
 // Scroll to bottom
 function scrollToBottom() {
@@ -51,7 +53,7 @@ function renderMessage(msg) {
 }
 
 // Update messages list
-function updateMessages() {
+function updateMessages(keepScroll = false) {
     const container = document.getElementById('messages-container');
     if (!container) return;
 
@@ -67,8 +69,43 @@ function updateMessages() {
         return;
     }
 
-    container.innerHTML = messages.map(renderMessage).join('');
-    scrollToBottom();
+    const olderButton = hasMore ? `
+        <div class="text-center">
+            <button id="load-older-btn" class="muted-button text-xs" ${loadingOlder ? 'disabled' : ''}>
+                ${loadingOlder ? 'Загрузка…' : 'Показать более ранние сообщения'}
+            </button>
+        </div>
+    ` : '';
+    container.innerHTML = olderButton + messages.map(renderMessage).join('');
+    document.getElementById('load-older-btn')?.addEventListener('click', loadOlderMessages);
+    if (!keepScroll) {
+        scrollToBottom();
+    }
+}
+
+// Load the page of history before the oldest message shown (archived messages included)
+async function loadOlderMessages() {
+    const oldest = messages.find(msg => !msg.system && msg.timestamp);
+    if (!oldest || loadingOlder) return;
+
+    loadingOlder = true;
+    updateMessages(true);
+    const container = document.getElementById('messages-container');
+    const previousHeight = container?.scrollHeight || 0;
+    try {
+        const page = await api.get(`/api/chat/messages?before=${encodeURIComponent(oldest.timestamp)}`);
+        messages = [...page.messages, ...messages];
+        hasMore = page.has_more;
+    } catch (err) {
+        console.error('Failed to load older messages:', err);
+    } finally {
+        loadingOlder = false;
+        updateMessages(true);
+        if (container) {
+            // Keep the message that was on top in place instead of jumping to the newest one
+            container.scrollTop = container.scrollHeight - previousHeight;
+        }
+    }
 }
 
 // Update connection status
@@ -123,6 +160,7 @@ function connectWebSocket() {
 
             if (data.type === 'history') {
                 messages = data.messages || [];
+                hasMore = Boolean(data.has_more);
             } else if (data.type === 'message') {
                 messages.push(data.data);
             }
@@ -215,4 +253,6 @@ export function unmount() {
     }
     messages = [];
     connected = false;
+    hasMore = false;
+    loadingOlder = false;
 }
@@ -1,5 +1,5 @@
 // Project Detail Page
-import { api } from '../api.js';
+import { api, API_URL } from '../api.js';
 import { auth } from '../auth.js';
 import { router } from '../router.js';
 import { getLanguage, renderMarkdown, isImageFile, isVideoFile, escapeHtml } from '../utils.js';
@@ -9,20 +9,224 @@ let project = null;
 let selectedFile = null;
 let editMode = false;
 let editContent = '';
+let eventSource = null;
+
+// Server-rendered HTML by content hash; null means the server could not render it
+const renderedHtml = new Map();
+const pendingRenders = new Set();
+
+// Images are shown through resized variants, so their base64 body is never fetched
+function isPreviewImage(file) {
+    return Boolean(file?.is_binary) && isImageFile(file.file_type);
+}
+
+// <img> cannot send the Authorization header; v pins the URL to this version of the file
+function thumbUrl(file, variant = 'thumb') {
+    const params = new URLSearchParams({ variant, v: file.content_hash || '', token: auth.getState().token || '' });
+    return `${API_URL}/api/files/${file.id}/thumb?${params}`;
+}
 
 // Fetch project
 async function fetchProject(id) {
     try {
         project = await api.get(`/api/projects/${id}`);
-        if (project.files?.length > 0) {
-            selectedFile = project.files[0];
-        }
+        const previous = selectedFile && project.files?.find(f => f.id === selectedFile.id);
+        selectedFile = previous || project.files?.[0] || null;
         renderPage();
     } catch (err) {
         showError('Failed to fetch project');
     }
 }
 
+// Re-render without losing unsaved text in the editor
+function rerender() {
+    const textarea = document.getElementById('edit-textarea');
+    if (editMode && textarea) {
+        editContent = textarea.value;
+    }
+    renderPage();
+}
+
+// Insert or replace a file in local state
+function upsertFile(file) {
+    if (!project) return;
+    const files = project.files || [];
+    const index = files.findIndex(f => f.id === file.id);
+    const merged = index >= 0 ? { ...files[index], ...file } : { ...file };
+    if (file.content_omitted) {
+        const unchanged = index >= 0 && files[index].updated_at === file.updated_at;
+        merged.content = unchanged ? files[index].content : undefined;
+    }
+    delete merged.content_omitted;
+
+    if (index >= 0) {
+        files[index] = merged;
+    } else {
+        files.push(merged);
+    }
+    project.files = files;
+
+    if (selectedFile?.id === merged.id) {
+        selectedFile = merged;
+        if (merged.content === undefined && !isPreviewImage(merged)) {
+            loadFileContent(merged.id);
+        }
+    }
+}
+
+// Remove a file from local state
+function removeFile(fileId) {
+    if (!project) return;
+    project.files = (project.files || []).filter(f => f.id !== fileId);
+    if (selectedFile?.id === fileId) {
+        selectedFile = null;
+        editMode = false;
+    }
+}
+
+// Load a file body that was left out of a change event
+async function loadFileContent(fileId) {
+    try {
+        const file = await api.get(`/api/files/${fileId}`);
+        upsertFile(file);
+        rerender();
+    } catch (err) {
+        showError('Failed to fetch file');
+    }
+}
+
+// Styles for the server's highlighted code, added once
+function ensureHighlightStyles() {
+    if (document.getElementById('highlight-css')) return;
+    const link = document.createElement('link');
+    link.id = 'highlight-css';
+    link.rel = 'stylesheet';
+    link.href = `${API_URL}/api/render/highlight.css`;
+    document.head.appendChild(link);
+}
+
+// Fetch rendered HTML for a file version; each version is rendered once on the server
+async function loadRenderedFile(file) {
+    const hash = file.content_hash;
+    if (pendingRenders.has(hash)) return;
+    pendingRenders.add(hash);
+    ensureHighlightStyles();
+    try {
+        const rendered = await api.get(`/api/files/${file.id}/rendered`);
+        renderedHtml.set(rendered.content_hash, rendered.html);
+        if (rendered.content_hash !== hash) {
+            renderedHtml.set(hash, null);
+        }
+    } catch (err) {
+        // Too large, unsupported or offline: render in the browser instead
+        renderedHtml.set(hash, null);
+    } finally {
+        pendingRenders.delete(hash);
+    }
+    if (selectedFile?.content_hash === hash) {
+        rerender();
+    }
+}
+
+// Number of code points in a string (the server counts edit offsets in code points)
+function codePointLength(text) {
+    let length = 0;
+    for (const _ of text) length++;
+    return length;
+}
+
+// Convert a code point offset into a UTF-16 string index
+function toUtf16Index(text, codePoints) {
+    let index = 0;
+    for (let i = 0; i < codePoints && index < text.length; i++) {
+        index += text.codePointAt(index) > 0xffff ? 2 : 1;
+    }
+    return index;
+}
+
+// Single range edit turning oldText into newText (common prefix/suffix trimmed)
+function computeEdit(oldText, newText) {
+    let start = 0;
+    const limit = Math.min(oldText.length, newText.length);
+    while (start < limit && oldText.charCodeAt(start) === newText.charCodeAt(start)) start++;
+
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+        oldEnd--;
+        newEnd--;
+    }
+
+    // Never split a surrogate pair
+    const isHigh = (code) => code >= 0xd800 && code <= 0xdbff;
+    const isLow = (code) => code >= 0xdc00 && code <= 0xdfff;
+    if (start > 0 && isHigh(oldText.charCodeAt(start - 1))) start--;
+    if (oldEnd < oldText.length && isLow(oldText.charCodeAt(oldEnd))) {
+        oldEnd++;
+        newEnd++;
+    }
+
+    const startCp = codePointLength(oldText.slice(0, start));
+    return {
+        start: startCp,
+        end: startCp + codePointLength(oldText.slice(start, oldEnd)),
+        text: newText.slice(start, newEnd),
+    };
+}
+
+// Apply server range edits (code point offsets) to local content
+function applyEdits(content, edits) {
+    let result = content;
+    [...edits].sort((a, b) => b.start - a.start).forEach(edit => {
+        const start = toUtf16Index(result, edit.start);
+        const end = start + toUtf16Index(result.slice(start), edit.end - edit.start);
+        result = result.slice(0, start) + edit.text + result.slice(end);
+    });
+    return result;
+}
+
+// Apply a file_patched event, falling back to a refetch when local content is stale
+function applyPatchEvent(event) {
+    const local = project?.files?.find(f => f.id === event.id);
+    const { base_hash: baseHash, edits, ...file } = event;
+    if (local && local.content !== undefined && edits && local.content_hash === baseHash) {
+        upsertFile({ ...file, content: applyEdits(local.content, edits) });
+    } else if (!local || local.content_hash !== file.content_hash) {
+        upsertFile({ ...file, content_omitted: true });
+    }
+}
+
+// Subscribe to the project change feed
+function subscribeToChanges(id) {
+    const state = auth.getState();
+    if (!state.token || typeof EventSource === 'undefined') return;
+
+    eventSource = new EventSource(`${API_URL}/api/projects/${id}/events?token=${encodeURIComponent(state.token)}`);
+
+    const onFileChange = (e) => {
+        upsertFile(JSON.parse(e.data));
+        rerender();
+    };
+    eventSource.addEventListener('file_created', onFileChange);
+    eventSource.addEventListener('file_updated', onFileChange);
+    eventSource.addEventListener('file_patched', (e) => {
+        applyPatchEvent(JSON.parse(e.data));
+        rerender();
+    });
+    eventSource.addEventListener('file_deleted', (e) => {
+        removeFile(JSON.parse(e.data).id);
+        rerender();
+    });
+    eventSource.addEventListener('project_updated', (e) => {
+        const { name, description } = JSON.parse(e.data);
+        Object.assign(project, { name, description });
+        rerender();
+    });
+    eventSource.addEventListener('project_deleted', () => router.navigate('/projects'));
+    // Missed too many events while disconnected: fall back to a full reload
+    eventSource.addEventListener('reset', () => fetchProject(id));
+}
+
 // Render the page content
 function renderPage() {
     const container = document.getElementById('project-content');
@@ -104,7 +308,9 @@ function renderFilesList() {
             ${project.files.map(file => `
                 <div class="file-item ${selectedFile?.id === file.id ? 'active' : ''}" data-file-id="${file.id}">
                     <span class="text-sm font-medium truncate flex items-center gap-2">
-                        <i class="fas fa-file text-xs"></i>
+                        ${isPreviewImage(file)
+                            ? `<img src="${thumbUrl(file)}" alt="" loading="lazy" class="w-5 h-5 object-cover rounded" />`
+                            : '<i class="fas fa-file text-xs"></i>'}
                         ${escapeHtml(file.name)}
                     </span>
                     ${state.isAdmin ? `
@@ -175,13 +381,18 @@ function renderFilePreview() {
 function renderFileContent(file) {
     if (!file) return '';
 
+    if (isPreviewImage(file)) {
+        const srcset = ['w320', 'w640', 'w1280'].map(variant => `${thumbUrl(file, variant)} ${variant.slice(1)}w`).join(', ');
+        return `<img src="${thumbUrl(file, 'w1280')}" srcset="${srcset}" sizes="(max-width: 1024px) 100vw, 800px" alt="${escapeHtml(file.name)}" class="max-w-full h-auto" />`;
+    }
+
+    if (file.content === undefined) {
+        return '<div class="text-center py-12 text-slate-300">Loading...</div>';
+    }
+
     if (file.is_binary) {
         const fileType = file.file_type.toLowerCase();
 
-        if (isImageFile(fileType)) {
-            return `<img src="data:image/${fileType};base64,${file.content}" alt="${escapeHtml(file.name)}" class="max-w-full h-auto" />`;
-        }
-
         if (isVideoFile(fileType)) {
             return `
                 <video controls class="max-w-full h-auto">
@@ -194,6 +405,19 @@ function renderFileContent(file) {
         return '<p class="text-github-textSecondary">Binary file - cannot display</p>';
     }
 
+    if (file.content_hash) {
+        const html = renderedHtml.get(file.content_hash);
+        if (html === undefined) {
+            loadRenderedFile(file);
+            return '<div class="text-center py-12 text-slate-300">Loading...</div>';
+        }
+        if (html !== null) {
+            return file.file_type === 'md'
+                ? `<div class="prose dark:prose-invert max-w-none text-[#b9bbbe]">${html}</div>`
+                : html;
+        }
+    }
+
     // Markdown
     if (file.file_type === 'md') {
         const html = renderMarkdown(file.content);
@@ -234,6 +458,9 @@ function attachEventListeners() {
             selectedFile = project.files.find(f => f.id === fileId);
             editMode = false;
             renderPage();
+            if (selectedFile && selectedFile.content === undefined && !isPreviewImage(selectedFile)) {
+                loadFileContent(fileId);
+            }
         });
     });
 
@@ -289,10 +516,8 @@ function showError(message) {
 async function handleDeleteFile(fileId) {
     try {
         await api.delete(`/api/files/${fileId}`);
-        if (selectedFile?.id === fileId) {
-            selectedFile = null;
-        }
-        await fetchProject(project.id);
+        removeFile(fileId);
+        renderPage();
     } catch (err) {
         showError(err.message || 'Failed to delete file');
     }
@@ -304,10 +529,27 @@ async function handleSaveFile() {
     if (newContent === undefined) return;
 
     try {
-        await api.put(`/api/files/${selectedFile.id}`, { content: newContent });
+        let file;
+        if (selectedFile.content_hash) {
+            // Send only the changed range; the server rejects it if the file moved on meanwhile
+            file = await api.patch(`/api/files/${selectedFile.id}`, {
+                base_hash: selectedFile.content_hash,
+                edits: [computeEdit(selectedFile.content, newContent)],
+            });
+        } else {
+            file = await api.put(`/api/files/${selectedFile.id}`, { content: newContent });
+        }
         editMode = false;
-        await fetchProject(project.id);
+        upsertFile(file);
+        renderPage();
     } catch (err) {
+        if (err.status === 409) {
+            editContent = newContent;
+            showError('File was changed by someone else. The latest version was loaded; save again to overwrite it.');
+            const latest = await api.get(`/api/files/${selectedFile.id}`);
+            upsertFile(latest);
+            return;
+        }
         showError(err.message || 'Failed to save file');
     }
 }
@@ -353,9 +595,10 @@ function showCreateFileModal() {
         };
 
         try {
-            await api.post('/api/files', fileData);
+            const file = await api.post('/api/files', fileData);
             hideModal();
-            await fetchProject(project.id);
+            upsertFile(file);
+            renderPage();
         } catch (err) {
             const errorEl = document.getElementById('modal-error');
             if (errorEl) {
@@ -372,8 +615,8 @@ function showUploadFileModal() {
         <form id="upload-file-form" class="space-y-5">
             <div id="modal-error" class="hidden surface-section p-3 text-sm text-red-200 border border-red-400/40 bg-red-500/10 rounded-xl"></div>
             <div class="space-y-2">
-                <label class="block text-sm font-semibold text-[#b9bbbe]">Выберите файл</label>
-                <input type="file" id="file-input" required class="input-field" />
+                <label class="block text-sm font-semibold text-[#b9bbbe]">Выберите файлы</label>
+                <input type="file" id="file-input" required multiple class="input-field" />
                 <p id="file-info" class="hidden text-xs text-[#7289DA] mt-2">
                     <i class="fas fa-check-circle mr-1"></i>
                     <span id="file-info-text"></span>
@@ -389,16 +632,18 @@ function showUploadFileModal() {
         </form>
     `;
 
-    showModal(content, { title: 'Загрузить файл', icon: 'fas fa-upload' });
+    showModal(content, { title: 'Загрузить файлы', icon: 'fas fa-upload' });
 
     const fileInput = document.getElementById('file-input');
     fileInput?.addEventListener('change', () => {
-        const file = fileInput.files[0];
-        if (file) {
+        const selected = Array.from(fileInput.files);
+        if (selected.length) {
             const fileInfo = document.getElementById('file-info');
             const fileInfoText = document.getElementById('file-info-text');
             if (fileInfo && fileInfoText) {
-                fileInfoText.textContent = `Выбран: ${file.name}`;
+                fileInfoText.textContent = selected.length === 1
+                    ? `Выбран: ${selected[0].name}`
+                    : `Выбрано файлов: ${selected.length}`;
                 fileInfo.classList.remove('hidden');
             }
         }
@@ -408,17 +653,28 @@ function showUploadFileModal() {
     document.getElementById('upload-file-form')?.addEventListener('submit', async (e) => {
         e.preventDefault();
 
-        const file = fileInput?.files[0];
-        if (!file) return;
+        const selected = Array.from(fileInput?.files || []);
+        if (!selected.length) return;
 
         const formData = new FormData();
         formData.append('project_id', project.id);
-        formData.append('file', file);
+        selected.forEach(file => formData.append('files', file));
 
         try {
-            await api.upload('/api/files/upload', formData);
-            hideModal();
-            await fetchProject(project.id);
+            const { results } = await api.upload('/api/files/upload/bulk', formData);
+            results.filter(r => r.file).forEach(r => upsertFile(r.file));
+            renderPage();
+
+            const failed = results.filter(r => r.status === 'error');
+            if (!failed.length) {
+                hideModal();
+                return;
+            }
+            const errorEl = document.getElementById('modal-error');
+            if (errorEl) {
+                errorEl.textContent = failed.map(r => `${r.name || '?'}: ${r.detail}`).join('; ');
+                errorEl.classList.remove('hidden');
+            }
         } catch (err) {
             const errorEl = document.getElementById('modal-error');
             if (errorEl) {
@@ -446,10 +702,13 @@ export function render(params) {
 export function mount(params) {
     const { id } = params;
     fetchProject(id);
+    subscribeToChanges(id);
 }
 
 // Unmount
 export function unmount() {
+    eventSource?.close();
+    eventSource = null;
     project = null;
     selectedFile = null;
     editMode = false;
@@ -5,11 +5,27 @@ import { formatDate } from '../utils.js';
 import { showModal, hideModal } from '../components/modal.js';
 
 let projects = [];
+let nextCursor = null;
 
-// Fetch projects
+// Fetch the first page of projects
 async function fetchProjects() {
     try {
-        projects = await api.get('/api/projects');
+        const page = await api.getPage('/api/projects');
+        projects = page.items;
+        nextCursor = page.nextCursor;
+        renderProjectsList();
+    } catch (err) {
+        showError('Failed to fetch projects');
+    }
+}
+
+// Append the next page of projects
+async function loadMoreProjects() {
+    if (!nextCursor) return;
+    try {
+        const page = await api.getPage('/api/projects', nextCursor);
+        projects = projects.concat(page.items);
+        nextCursor = page.nextCursor;
         renderProjectsList();
     } catch (err) {
         showError('Failed to fetch projects');
@@ -21,6 +37,8 @@ function renderProjectsList() {
     const container = document.getElementById('projects-grid');
     const state = auth.getState();
 
+    document.getElementById('load-more-btn')?.classList.toggle('hidden', !nextCursor);
+
     if (projects.length === 0) {
         container.innerHTML = `
             <div class="col-span-full surface-section p-6 text-center text-slate-300">
@@ -155,6 +173,10 @@ export function render() {
                 <div id="projects-grid" class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-5">
                     <div class="col-span-full text-center py-12 text-xl text-slate-300">Loading...</div>
                 </div>
+
+                <div class="text-center">
+                    <button id="load-more-btn" class="muted-button hidden">Показать ещё</button>
+                </div>
             </div>
         </div>
     `;
@@ -165,9 +187,11 @@ export function mount() {
     fetchProjects();
 
     document.getElementById('create-project-btn')?.addEventListener('click', showCreateModal);
+    document.getElementById('load-more-btn')?.addEventListener('click', loadMoreProjects);
 }
 
 // Unmount
 export function unmount() {
     projects = [];
+    nextCursor = null;
 }
@@ -26,7 +26,7 @@ function parseFrameworks(frameworks) {
 async function fetchServices() {
     try {
         const state = auth.getState();
-        services = await api.get('/api/services');
+        services = await api.getAll('/api/services');
         renderServicesList();
     } catch (err) {
         showError('Не удалось загрузить услуги');
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict
+
+from fastapi import HTTPException
+
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "200"))
+
+# "$<ref>.<field>" points at a field of an earlier step's result, e.g. "$project.id".
+_REFERENCE_RE = re.compile(r"^\$([A-Za-z_][\w-]*)\.(\w+)$")
+
+
+def resolve_references(value: Any, results: Dict[str, Dict[str, Any]]) -> Any:
+    if isinstance(value, str):
+        match = _REFERENCE_RE.match(value)
+        if not match:
+            return value
+        ref, field = match.groups()
+        if ref not in results:
+            raise HTTPException(status_code=400, detail=f"Unknown reference '{ref}'")
+        if field not in results[ref]:
+            raise HTTPException(status_code=400, detail=f"Reference '{ref}' has no field '{field}'")
+        return results[ref][field]
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    return value
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from text_patch import RangeEdit
+
+CHANGE_FEED_BACKLOG = int(os.getenv("CHANGE_FEED_BACKLOG", "64"))
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+CHANGE_FEED_QUEUE_SIZE = 100
+# A channel nobody is subscribed to is dropped after this long without events; a client that
+# comes back later with its Last-Event-ID gets a reset and refetches the project.
+CHANGE_FEED_IDLE_TTL_SECONDS = float(os.getenv("CHANGE_FEED_IDLE_TTL_SECONDS", "600"))
+_SWEEP_INTERVAL_SECONDS = 60.0
+# Text bodies up to this size ride along with the event; larger ones are fetched on demand.
+CHANGE_FEED_INLINE_LIMIT = int(os.getenv("CHANGE_FEED_INLINE_LIMIT", "65536"))
+
+
+class ProjectChannel:
+    def __init__(self, start: int = 0) -> None:
+        # Ids continue above every dropped channel's, so an id from before a drop is never
+        # mistaken for one of this channel's events.
+        self.start = start
+        self.sequence = start
+        self.backlog: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=CHANGE_FEED_BACKLOG)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.active_at = time.monotonic()
+
+
+class ChangeFeed:
+    def __init__(self) -> None:
+        self.channels: Dict[str, ProjectChannel] = {}
+        self._sequence_floor = 0
+        self._swept_at = time.monotonic()
+
+    def _channel(self, project_id: str) -> ProjectChannel:
+        channel = self.channels.get(project_id)
+        if channel is None:
+            self._sweep()
+            channel = self.channels[project_id] = ProjectChannel(self._sequence_floor)
+        return channel
+
+    def _drop(self, project_id: str) -> None:
+        channel = self.channels.pop(project_id, None)
+        if channel is not None:
+            self._sequence_floor = max(self._sequence_floor, channel.sequence)
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._swept_at < _SWEEP_INTERVAL_SECONDS:
+            return
+        self._swept_at = now
+        for project_id, channel in list(self.channels.items()):
+            if not channel.subscribers and now - channel.active_at >= CHANGE_FEED_IDLE_TTL_SECONDS:
+                self._drop(project_id)
+
+    def close(self, project_id: str) -> None:
+        # After a project is deleted: open streams keep their queues but get nothing further.
+        self._drop(project_id)
+
+    def publish(self, project_id: str, event: str, data: Dict[str, Any]) -> int:
+        channel = self._channel(project_id)
+        channel.sequence += 1
+        entry = (channel.sequence, event, data)
+        channel.backlog.append(entry)
+        channel.active_at = time.monotonic()
+        for queue in list(channel.subscribers):
+            if queue.qsize() >= CHANGE_FEED_QUEUE_SIZE:
+                # A consumer this far behind is told to resync instead of blocking writers.
+                channel.subscribers.discard(queue)
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(entry)
+        return channel.sequence
+
+    def subscribe(self, project_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE + 1)
+        self._channel(project_id).subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, project_id: str, queue: asyncio.Queue) -> None:
+        channel = self.channels.get(project_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        channel.active_at = time.monotonic()
+        if not channel.subscribers and not channel.backlog:
+            self._drop(project_id)
+
+    def replay(self, project_id: str, last_event_id: int) -> Optional[List[Tuple[int, str, Dict[str, Any]]]]:
+        # None means the client has to resync.
+        channel = self.channels.get(project_id)
+        if channel is None:
+            return [] if last_event_id == self._sequence_floor else None
+        if last_event_id == channel.sequence:
+            return []
+        if last_event_id > channel.sequence or last_event_id < channel.start:
+            return None
+        if not channel.backlog or channel.backlog[0][0] > last_event_id + 1:
+            return None
+        return [entry for entry in channel.backlog if entry[0] > last_event_id]
+
+    def current_sequence(self, project_id: str) -> int:
+        channel = self.channels.get(project_id)
+        return channel.sequence if channel else self._sequence_floor
+
+    async def stream(
+        self,
+        project_id: str,
+        last_event_id: Optional[str],
+        is_disconnected: Callable[[], Awaitable[bool]],
+    ) -> AsyncIterator[str]:
+        queue = self.subscribe(project_id)
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id is not None:
+                try:
+                    missed = self.replay(project_id, int(last_event_id))
+                except ValueError:
+                    missed = None
+                if missed is None:
+                    yield format_event(self.current_sequence(project_id), "reset", {"project_id": project_id})
+                else:
+                    for entry in missed:
+                        yield format_event(*entry)
+            else:
+                yield format_event(self.current_sequence(project_id), "ready", {"project_id": project_id})
+
+            while True:
+                try:
+                    entry = await asyncio.wait_for(queue.get(), timeout=CHANGE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if entry is None:
+                    yield format_event(self.current_sequence(project_id), "reset", {"project_id": project_id})
+                    break
+                yield format_event(*entry)
+        finally:
+            self.unsubscribe(project_id, queue)
+
+
+def format_event(event_id: int, event: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def file_event_payload(file_data: Dict[str, Any]) -> Dict[str, Any]:
+    payload = dict(file_data)
+    content = payload.get("content")
+    if payload.get("is_binary") or (content is not None and len(content) > CHANGE_FEED_INLINE_LIMIT):
+        payload.pop("content", None)
+        payload["content_omitted"] = True
+    return payload
+
+
+def patch_event_payload(file_data: Dict[str, Any], base_hash: Optional[str], edits: List[RangeEdit]) -> Dict[str, Any]:
+    payload = {key: value for key, value in file_data.items() if key != "content"}
+    payload["base_hash"] = base_hash
+    if sum(len(replacement) for _, _, replacement in edits) > CHANGE_FEED_INLINE_LIMIT:
+        payload["content_omitted"] = True
+    else:
+        payload["edits"] = [{"start": start, "end": end, "text": replacement} for start, end, replacement in edits]
+    return payload
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import zstandard
+from sqlalchemy import delete, func, select
+
+from database import BASE_DIR, ChatMessage, async_session_factory
+from metrics import CHAT_MESSAGES_ARCHIVED
+
+# Messages older than this many days move from chat_messages to the archive; 0 keeps everything.
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "90"))
+CHAT_ARCHIVE_DIR = Path(os.getenv("CHAT_ARCHIVE_DIR", str(BASE_DIR / "chat_archive")))
+# Rows removed per DELETE; each batch commits on its own so chat inserts never wait long for the lock.
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "500"))
+CHAT_ARCHIVE_ZSTD_LEVEL = int(os.getenv("CHAT_ARCHIVE_ZSTD_LEVEL", "10"))
+_SEGMENT_SUFFIX = ".ndjson.zst"
+
+Record = Dict[str, Any]
+
+# (directory mtime, sorted days) from the last scan of CHAT_ARCHIVE_DIR.
+_archived_days: Tuple[Optional[int], List[date]] = (None, [])
+
+
+def archive_record(row: Any) -> Record:
+    # Same shape as the chat API's messages, so archived ones can be returned untouched.
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "message": row.message,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
+def segment_path(day: date) -> Path:
+    # One zstd-compressed NDJSON file per day, ordered by (timestamp, id).
+    return CHAT_ARCHIVE_DIR / f"{day.isoformat()}{_SEGMENT_SUFFIX}"
+
+
+def archive_cutoff() -> Optional[datetime]:
+    # Messages before this moment belong in the archive; None when retention is off.
+    if CHAT_RETENTION_DAYS <= 0:
+        return None
+    return datetime.combine(date.today() - timedelta(days=CHAT_RETENTION_DAYS), datetime.min.time())
+
+
+def archived_days() -> List[date]:
+    # Rescanned only when the directory's mtime moves: segments are renamed into it, so a
+    # segment written by another process is noticed after a single stat().
+    global _archived_days
+    try:
+        mtime_ns = CHAT_ARCHIVE_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _archived_days[0] != mtime_ns:
+        days = []
+        for entry in os.scandir(CHAT_ARCHIVE_DIR):
+            if entry.name.endswith(_SEGMENT_SUFFIX):
+                try:
+                    days.append(date.fromisoformat(entry.name[: -len(_SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        _archived_days = (mtime_ns, sorted(days))
+    return _archived_days[1]
+
+
+@lru_cache(maxsize=32)
+def _load_segment(path: str, mtime_ns: int) -> Tuple[Record, ...]:
+    # Keyed by mtime as well, so a segment rewritten by the archive job is read afresh.
+    with open(path, "rb") as fh:
+        payload = zstandard.ZstdDecompressor().decompress(fh.read())
+    return tuple(json.loads(line) for line in payload.splitlines() if line)
+
+
+def read_segment(day: date) -> Tuple[Record, ...]:
+    path = segment_path(day)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return ()
+    return _load_segment(str(path), mtime_ns)
+
+
+def write_segment(day: date, records: Iterable[Record]) -> None:
+    global _archived_days
+    # Merged with what the segment already holds: a run that died between writing the file and
+    # deleting the rows simply writes the same messages again. The file is swapped in atomically.
+    merged = {record["id"]: record for record in read_segment(day)}
+    merged.update((record["id"], record) for record in records)
+    ordered = sorted(merged.values(), key=lambda record: (record["timestamp"] or "", record["id"]))
+    payload = b"".join(
+        json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n" for record in ordered
+    )
+    CHAT_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = segment_path(day)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as fh:
+        fh.write(zstandard.ZstdCompressor(level=CHAT_ARCHIVE_ZSTD_LEVEL).compress(payload))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(temporary, path)
+    # Dropped explicitly too, in case the rename lands within the directory mtime's granularity.
+    _archived_days = (None, [])
+
+
+def read_archived_before(before: datetime, limit: int, exclude: Set[str]) -> List[Record]:
+    # Newest first, strictly older than `before`. ISO timestamps of naive datetimes sort as text.
+    before_iso = before.isoformat()
+    found: List[Record] = []
+    for day in reversed(archived_days()):
+        if day > before.date():
+            continue
+        for record in reversed(read_segment(day)):
+            if (record["timestamp"] or "") < before_iso and record["id"] not in exclude:
+                found.append(record)
+                if len(found) >= limit:
+                    return found
+    return found
+
+
+async def iter_archived(days: List[date], since: Optional[datetime], until: Optional[datetime]) -> AsyncIterator[Record]:
+    # Oldest first, since <= timestamp < until; segments are read off the event loop one at a time.
+    since_iso = since.isoformat() if since else ""
+    until_iso = until.isoformat() if until else None
+    for day in days:
+        if since is not None and day < since.date():
+            continue
+        if until is not None and day > until.date():
+            break
+        for record in await asyncio.to_thread(read_segment, day):
+            timestamp = record["timestamp"] or ""
+            if timestamp >= since_iso and (until_iso is None or timestamp < until_iso):
+                yield record
+
+
+async def archive_chat_messages() -> Dict[str, int]:
+    # Moves whole days older than the retention window, oldest first; every day is written to its
+    # segment before its rows are deleted, so an interrupted run loses nothing and resumes later.
+    cutoff = archive_cutoff()
+    if cutoff is None:
+        return {"archived": 0, "days": 0}
+    archived = days = 0
+    while True:
+        async with async_session_factory() as session:
+            oldest = await session.scalar(select(func.min(ChatMessage.timestamp)).where(ChatMessage.timestamp < cutoff))
+            if oldest is None:
+                break
+            day_start = datetime.combine(oldest.date(), datetime.min.time())
+            result = await session.execute(
+                select(ChatMessage.__table__)
+                .where(ChatMessage.timestamp >= day_start, ChatMessage.timestamp < day_start + timedelta(days=1))
+                .order_by(ChatMessage.timestamp, ChatMessage.id)
+            )
+            records = [archive_record(row) for row in result]
+        await asyncio.to_thread(write_segment, day_start.date(), records)
+
+        ids = [record["id"] for record in records]
+        for offset in range(0, len(ids), CHAT_ARCHIVE_BATCH_SIZE):
+            async with async_session_factory() as session:
+                await session.execute(
+                    delete(ChatMessage).where(ChatMessage.id.in_(ids[offset : offset + CHAT_ARCHIVE_BATCH_SIZE]))
+                )
+                await session.commit()
+        CHAT_MESSAGES_ARCHIVED.inc(len(ids))
+        archived += len(ids)
+        days += 1
+    return {"archived": archived, "days": days}
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Authenticated JSON: browsers may keep it but must revalidate, and shared caches must not store it.
+PRIVATE_REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def weak_etag(*parts: Any) -> str:
+    # Built from row versions (ids, updated_at, content hashes), never from the body itself, so
+    # it can be checked without loading file contents.
+    digest = hashlib.sha256("\x1f".join("" if part is None else str(part) for part in parts).encode("utf-8"))
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored on both sides.
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return etag.removeprefix("W/") in candidates or "*" in candidates
+
+
+def not_modified(etag: str, cache_control: str = PRIVATE_REVALIDATE_CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
@@ -1,14 +1,20 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
+import re
+import time
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import AsyncIterator, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import Boolean, DateTime, ForeignKey, String, Text
+from sqlalchemy import event
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint, inspect, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, validates
 
 load_dotenv()
 
@@ -31,13 +37,120 @@ async_session_factory = async_sessionmaker(
     class_=AsyncSession,
 )
 
+def env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+# DEBUG turns on per-response X-DB-Queries / Server-Timing headers.
+DEBUG = env_flag("DEBUG")
+DEBUG_HEADERS = ["X-DB-Queries", "Server-Timing"] if DEBUG else []
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_MAX_STATEMENT = 2000
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+
+class QueryStats:
+    # Accumulated per HTTP request; `scope` lets the slow-query log name the calling route.
+    __slots__ = ("queries", "db_time", "scope")
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None) -> None:
+        self.queries = 0
+        self.db_time = 0.0
+        self.scope = scope
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+_query_observers: List[Callable[[str, float], None]] = []
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def add_query_observer(observer: Callable[[str, float], None]) -> None:
+    # Observers get (statement, seconds) for every executed statement.
+    _query_observers.append(observer)
+
+
+def statement_operation(statement: str) -> str:
+    # The leading SQL verb (SELECT, INSERT, ...), used to label query metrics and spans.
+    head = statement.lstrip()[:10].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def _parameters_shape(parameters: Any, executemany: bool) -> Any:
+    # Types only, never values: parameters carry password hashes and file contents.
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameters[0] if parameters else None
+        return {"rows": len(parameters), "row": _parameters_shape(first, False)}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _log_slow_query(statement: str, parameters: Any, executemany: bool, elapsed: float, stats: Optional[QueryStats]) -> None:
+    scope = stats.scope if stats is not None else None
+    route = getattr(scope.get("route"), "path", None) if scope else None
+    record = {
+        "event": "slow_query",
+        "duration_ms": round(elapsed * 1000, 2),
+        "statement": _WHITESPACE_RE.sub(" ", statement).strip()[:SLOW_QUERY_MAX_STATEMENT],
+        "parameters": _parameters_shape(parameters, executemany),
+        "method": scope.get("method") if scope else None,
+        "route": route or (scope.get("path") if scope else None),
+    }
+    slow_query_logger.warning("Slow query (%.1f ms)", record["duration_ms"], extra={"fields": record})
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+    for observer in _query_observers:
+        observer(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _log_slow_query(statement, parameters, executemany, elapsed, stats)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record) -> None:
+    # Only takes effect on a database file that has no tables yet; existing files are switched
+    # over once with scripts/convert_auto_vacuum.py.
+    if engine.dialect.name == "sqlite":
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def compute_content_hash(content: Optional[str]) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     username: Mapped[str] = mapped_column(String(50), unique=True, index=True)
@@ -49,6 +162,10 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),
+        Index("ix_projects_name_id", "name", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     name: Mapped[str] = mapped_column(String(255))
@@ -64,11 +181,60 @@ class File(Base):
     project_id: Mapped[str] = mapped_column(String(36), ForeignKey("projects.id"), nullable=False)
     name: Mapped[str] = mapped_column(String(255))
     content: Mapped[str] = mapped_column(Text)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     file_type: Mapped[str] = mapped_column(String(50))
     is_binary: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    @validates("content")
+    def _track_content_hash(self, key: str, value: str) -> str:
+        self.content_hash = compute_content_hash(value)
+        return value
+
+
+class FileRevision(Base):
+    __tablename__ = "file_revisions"
+    __table_args__ = (UniqueConstraint("file_id", "revision", name="uq_file_revisions_file_revision"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    file_id: Mapped[str] = mapped_column(String(36), ForeignKey("files.id"), nullable=False, index=True)
+    revision: Mapped[int] = mapped_column(Integer, nullable=False)
+    # "snapshot": payload is the full content; "delta": JSON range edits against the previous revision.
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_by: Mapped[Optional[str]] = mapped_column(String(36), ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class ImageDerivative(Base):
+    # Resized copies of an image, keyed by the original's content hash so identical uploads share them.
+    __tablename__ = "image_derivatives"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    variant: Mapped[str] = mapped_column(String(20), primary_key=True)
+    media_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    width: Mapped[int] = mapped_column(Integer, nullable=False)
+    height: Mapped[int] = mapped_column(Integer, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class ScheduledJob(Base):
+    # One row per background job, shared by every server process: whoever holds the lease runs it.
+    __tablename__ = "scheduled_jobs"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_status: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
 
 class PasswordReset(Base):
     __tablename__ = "password_resets"
@@ -83,6 +249,7 @@ class PasswordReset(Base):
 
 class AdminResetRequest(Base):
     __tablename__ = "admin_reset_requests"
+    __table_args__ = (Index("ix_admin_reset_requests_status_requested_at_id", "status", "requested_at", "id"),)
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id"), nullable=False)
@@ -99,11 +266,16 @@ class ChatMessage(Base):
     user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id"), nullable=False)
     username: Mapped[str] = mapped_column(String(50), nullable=False)
     message: Mapped[str] = mapped_column(Text, nullable=False)
-    timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    # Indexed for history paging and for finding the days the retention job archives.
+    timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
 
 
 class Service(Base):
     __tablename__ = "services"
+    __table_args__ = (
+        Index("ix_services_created_at_id", "created_at", "id"),
+        Index("ix_services_name_id", "name", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -116,9 +288,43 @@ class Service(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
+def _upgrade_existing_tables(connection) -> None:
+    # create_all never alters existing tables; new nullable columns and indexes are added in place.
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+async def _backfill_content_hashes(batch_size: int = 500) -> None:
+    async with async_session_factory() as session:
+        while True:
+            result = await session.execute(
+                select(File.id, File.content).where(File.content_hash.is_(None)).limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            await session.execute(
+                update(File),
+                [{"id": file_id, "content_hash": compute_content_hash(content)} for file_id, content in rows],
+            )
+            await session.commit()
+
+
 async def init_models() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_existing_tables)
+    await _backfill_content_hashes()
 
 
 async def get_session() -> AsyncIterator[AsyncSession]:
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from database import compute_content_hash
+
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "8"))
+BULK_UPLOAD_MAX_FILES = int(os.getenv("BULK_UPLOAD_MAX_FILES", "500"))
+
+BINARY_FILE_TYPES = {
+    "png",
+    "jpg",
+    "jpeg",
+    "gif",
+    "webp",
+    "mp4",
+    "avi",
+    "mov",
+    "webm",
+    "ico",
+}
+# Binary types Pillow can decode; these get thumbnails and resized variants.
+IMAGE_FILE_TYPES = {"png", "jpg", "jpeg", "gif", "webp", "ico"}
+# Already-compressed formats gain nothing from deflate.
+COMPRESSED_FILE_TYPES = {"png", "jpg", "jpeg", "gif", "webp", "mp4", "avi", "mov", "webm"}
+
+
+def file_type_from_name(filename: str) -> str:
+    return filename.split(".")[-1] if "." in filename else "txt"
+
+
+def decode_upload(filename: str, raw: bytes) -> Tuple[str, str, bool]:
+    # Returns (stored content, file_type, is_binary); binaries are stored base64-encoded.
+    file_type = file_type_from_name(filename)
+    if file_type in BINARY_FILE_TYPES:
+        return base64.b64encode(raw).decode("utf-8"), file_type, True
+    try:
+        return raw.decode("utf-8"), file_type, False
+    except UnicodeDecodeError:
+        return base64.b64encode(raw).decode("utf-8"), file_type, True
+
+
+def iter_file_bytes(content: str, is_binary: bool, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    # Decodes stored content piecewise; base64 is cut on 4-character boundaries.
+    if is_binary:
+        step = chunk_size // 3 * 4
+        for start in range(0, len(content), step):
+            yield base64.b64decode(content[start:start + step])
+    else:
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size].encode("utf-8")
+
+
+def _decode_and_hash(filename: str, raw: bytes) -> Dict[str, Any]:
+    content, file_type, is_binary = decode_upload(filename, raw)
+    return {
+        "name": filename,
+        "content": content,
+        "content_hash": compute_content_hash(content),
+        "file_type": file_type,
+        "is_binary": is_binary,
+    }
+
+
+async def decode_uploads(files: List[UploadFile]) -> List[Dict[str, Any]]:
+    # Decoding and hashing run in the threadpool, at most BULK_UPLOAD_CONCURRENCY at a time.
+    # Each entry is either a row-ready dict or {"name", "error"}; order matches the input.
+    semaphore = asyncio.Semaphore(BULK_UPLOAD_CONCURRENCY)
+
+    async def decode_one(upload: UploadFile) -> Dict[str, Any]:
+        name = (upload.filename or "").strip()
+        if not name:
+            return {"name": name, "error": "Missing file name"}
+        async with semaphore:
+            try:
+                raw = await upload.read()
+                return await run_in_threadpool(_decode_and_hash, name, raw)
+            except OSError as exc:
+                return {"name": name, "error": f"Failed to read file: {exc}"}
+
+    return list(await asyncio.gather(*(decode_one(upload) for upload in files)))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Set
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import File as FileModel, ImageDerivative, async_session_factory
+from image_variants import DERIVATIVE_MEDIA_TYPE, build_variants
+from metrics import IMAGE_DERIVATIVE_JOBS, IMAGE_DERIVATIVE_SECONDS
+from single_flight import SingleFlight
+
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Variants are addressed by content hash, so a URL carrying ?v=<hash> never changes meaning.
+DERIVATIVE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+_FAILED_HASHES_LIMIT = 1000
+
+derivative_logger = logging.getLogger("app.images")
+
+
+class DerivativePipeline:
+    # Decoding and resizing run in a process pool: Pillow holds the GIL for parts of both, and
+    # a worker choking on a hostile image cannot take the server down with it.
+    def __init__(self, workers: int = IMAGE_DERIVATIVE_WORKERS) -> None:
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flights = SingleFlight("image_derivatives")
+        self._tasks: Set[asyncio.Task] = set()
+        # Images that failed to decode are not retried on every request.
+        self._failed: Set[str] = set()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forkserver workers start from a clean process instead of forking the server's
+            # threads; platforms without it fall back to spawn.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                context.set_forkserver_preload(["image_variants"])
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    def schedule(self, file_id: str, content_hash: str) -> None:
+        # Fire-and-forget after an upload commits; the thumb endpoint also generates on demand.
+        task = asyncio.get_running_loop().create_task(self.ensure(file_id, content_hash))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def ensure(self, file_id: str, content_hash: str) -> None:
+        if content_hash in self._failed:
+            return
+        await self._flights.do(content_hash, lambda: self._generate(file_id, content_hash))
+
+    async def _generate(self, file_id: str, content_hash: str) -> None:
+        async with async_session_factory() as session:
+            if await has_derivatives(session, content_hash):
+                IMAGE_DERIVATIVE_JOBS.labels("skipped").inc()
+                return
+            result = await session.execute(select(FileModel.content).where(FileModel.id == file_id))
+            content = result.scalar_one_or_none()
+        if content is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            variants = await loop.run_in_executor(self._executor(), build_variants, content)
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool):
+                # A worker died (out of memory, a crash in a codec); start a fresh pool next time.
+                self._pool = None
+            IMAGE_DERIVATIVE_JOBS.labels("failed").inc()
+            if len(self._failed) >= _FAILED_HASHES_LIMIT:
+                self._failed.clear()
+            self._failed.add(content_hash)
+            derivative_logger.warning("Could not build image variants for file %s: %s", file_id, exc)
+            return
+        IMAGE_DERIVATIVE_SECONDS.observe(loop.time() - started)
+
+        rows = [
+            {
+                "content_hash": content_hash,
+                "variant": name,
+                "media_type": DERIVATIVE_MEDIA_TYPE,
+                "width": width,
+                "height": height,
+                "data": data,
+            }
+            for name, width, height, data in variants
+        ]
+        async with async_session_factory() as session:
+            # Another server process may have stored the same hash meanwhile.
+            await session.execute(insert(ImageDerivative).prefix_with("OR IGNORE", dialect="sqlite"), rows)
+            await session.commit()
+        IMAGE_DERIVATIVE_JOBS.labels("generated").inc()
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def has_derivatives(session: AsyncSession, content_hash: str) -> bool:
+    result = await session.execute(
+        select(ImageDerivative.variant).where(ImageDerivative.content_hash == content_hash).limit(1)
+    )
+    return result.first() is not None
+
+
+async def load_derivative(session: AsyncSession, content_hash: str, variant: str) -> Optional[ImageDerivative]:
+    return await session.get(ImageDerivative, (content_hash, variant))
+
+
+image_pipeline = DerivativePipeline()
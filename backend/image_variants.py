@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import base64
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# Runs inside the derivative worker processes, so this module stays free of app imports.
+
+# name -> (max width, max height); aspect ratio is kept and images are never upscaled.
+IMAGE_VARIANTS: Dict[str, Tuple[int, Optional[int]]] = {
+    "thumb": (256, 256),
+    "w320": (320, None),
+    "w640": (640, None),
+    "w1280": (1280, None),
+}
+DERIVATIVE_MEDIA_TYPE = "image/webp"
+DERIVATIVE_QUALITY = 80
+# Refuse decompression bombs well below Pillow's own limit.
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+_UNBOUNDED = 1 << 16
+
+
+def _bounds(variant: str) -> Tuple[int, int]:
+    width, height = IMAGE_VARIANTS[variant]
+    return width, height or _UNBOUNDED
+
+
+def build_variants(content: str) -> List[Tuple[str, int, int, bytes]]:
+    # content is the stored base64 text; decoding here keeps that work off the event loop too.
+    with Image.open(BytesIO(base64.b64decode(content))) as source:
+        # JPEG can decode straight to a reduced size, which is most of the cost for big photos.
+        # Both sides stay at least the largest variant's width, whichever way EXIF rotates them.
+        largest = max(width for width, _ in IMAGE_VARIANTS.values())
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    variants = []
+    # Largest first, each one resized from the previous: shrinking an already small image is cheap.
+    for name in sorted(IMAGE_VARIANTS, key=lambda variant: _bounds(variant)[0], reverse=True):
+        image = image.copy()
+        image.thumbnail(_bounds(name), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=DERIVATIVE_QUALITY, method=4)
+        variants.append((name, image.width, image.height, buffer.getvalue()))
+    return variants
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from database import current_query_stats, env_flag
+from metrics import LOG_RECORDS_DROPPED
+from tracing import current_trace_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG = env_flag("ACCESS_LOG", True)
+# Requests slower than this are always logged, even on sampled routes.
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+
+access_logger = logging.getLogger("app.access")
+error_logger = logging.getLogger("app.error")
+
+_listener: Optional[QueueListener] = None
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    # "route=rate,route=rate"; the route is the template (/api/projects/{project_id}) or the raw path.
+    rates: Dict[str, float] = {}
+    for item in raw.split(","):
+        route, _, rate = item.strip().rpartition("=")
+        if route:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "/api/health=0.01"))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            payload["trace_id"] = trace_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # The stock prepare() formats the record on the caller's thread; here the caller only merges
+    # the message arguments and everything else (JSON, tracebacks, stdout writes) is left to the
+    # listener thread.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        # The span context only exists on the caller's side.
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging() -> None:
+    # Every "app.*" logger goes through a bounded queue to one writer thread, so a slow or
+    # blocked stdout can never stall the event loop; when the queue is full records are dropped.
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    app_logger = logging.getLogger("app")
+    app_logger.handlers = [_NonBlockingQueueHandler(log_queue)]
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.propagate = False
+    _listener = QueueListener(log_queue, writer)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    # Drains whatever is still queued before returning.
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _should_log(route: str, status_code: int, elapsed: float) -> bool:
+    if status_code >= 500 or elapsed * 1000 >= ACCESS_LOG_SLOW_MS:
+        return True
+    rate = LOG_SAMPLE_RATES.get(route)
+    return rate is None or random.random() < rate
+
+
+class AccessLogMiddleware:
+    # Must sit inside MetricsMiddleware and TracingMiddleware: it reads the QueryStats and the
+    # trace context they install.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not ACCESS_LOG:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            error_logger.exception(
+                "Unhandled error", extra={"fields": {"method": scope["method"], "path": scope["path"]}}
+            )
+            raise
+        finally:
+            self._log(scope, status_code, time.perf_counter() - started)
+
+    @staticmethod
+    def _log(scope, status_code: int, elapsed: float) -> None:
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        if not _should_log(route, status_code, elapsed):
+            return
+        stats = current_query_stats.get()
+        client = scope.get("client")
+        access_logger.info(
+            "%s %s %s",
+            scope["method"],
+            scope["path"],
+            status_code,
+            extra={
+                "fields": {
+                    "event": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "db_queries": stats.queries if stats is not None else None,
+                    "db_ms": round(stats.db_time * 1000, 2) if stats is not None else None,
+                    "user_id": scope.get("state", {}).get("user_id"),
+                    "client": client[0] if client else None,
+                }
+            },
+        )
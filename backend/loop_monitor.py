@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from database import DEBUG, env_flag
+from metrics import LOOP_BLOCK_DURATION, LOOP_BLOCKS, LOOP_LAG, LOOP_LAG_LAST
+
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+# The stack-capturing watchdog thread only runs in debug mode unless enabled explicitly.
+LOOP_BLOCK_DETECTOR = env_flag("LOOP_BLOCK_DETECTOR", DEBUG)
+
+loop_logger = logging.getLogger("app.loop")
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+        block_threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+        detect_blocking: bool = LOOP_BLOCK_DETECTOR,
+    ) -> None:
+        self.threshold = block_threshold_ms / 1000
+        self.detect_blocking = detect_blocking
+        # The heartbeat must tick well inside the threshold for a stall to be noticed in time.
+        interval = interval_ms / 1000
+        self.tick = min(interval, self.threshold / 2) if detect_blocking else interval
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._collectors: List[List[float]] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        if self.detect_blocking:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _measure(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            now = time.perf_counter()
+            self._heartbeat = now
+            lag = max(0.0, now - started - self.tick)
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+            for samples in self._collectors:
+                samples.append(lag)
+
+    @contextmanager
+    def collect_lag(self) -> Iterator[List[float]]:
+        # Hands out the heartbeat's lag samples while the block runs (e.g. for a profile),
+        # instead of a second sleep loop measuring the same thing.
+        samples: List[float] = []
+        self._collectors.append(samples)
+        try:
+            yield samples
+        finally:
+            self._collectors.remove(samples)
+
+    def _capture_loop_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return [f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in traceback.extract_stack(frame)]
+
+    def _watch(self) -> None:
+        # Runs in its own thread, so it keeps going while the loop is stuck and can grab
+        # the loop thread's stack mid-stall, which is where the blocking call still is.
+        stalled_from: Optional[float] = None
+        stack: List[str] = []
+        while not self._stop.wait(self.tick / 2):
+            last_beat = self._heartbeat
+            overdue = time.perf_counter() - last_beat - self.tick
+            if stalled_from is None:
+                if overdue >= self.threshold:
+                    stalled_from = last_beat
+                    stack = self._capture_loop_stack()
+                    LOOP_BLOCKS.inc()
+            elif last_beat != stalled_from:
+                blocked = max(0.0, last_beat - stalled_from - self.tick)
+                LOOP_BLOCK_DURATION.observe(blocked)
+                record = {
+                    "event": "loop_blocked",
+                    "blocked_ms": round(blocked * 1000, 2),
+                    "threshold_ms": round(self.threshold * 1000, 2),
+                    "stack": stack,
+                }
+                loop_logger.warning("Event loop blocked for %.1f ms", record["blocked_ms"], extra={"fields": record})
+                stalled_from = None
+                stack = []
+
+
+loop_monitor = LoopMonitor()
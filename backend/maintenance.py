@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import delete, or_, select
+
+from chat_archive import archive_chat_messages
+from database import AdminResetRequest, File as FileModel, ImageDerivative, PasswordReset, async_session_factory, engine
+from scheduler import Scheduler
+
+# Handled admin reset requests are kept this long for the admin panel's history view.
+ADMIN_RESET_RETENTION_DAYS = int(os.getenv("ADMIN_RESET_RETENTION_DAYS", "30"))
+# Free pages handed back to the filesystem per incremental vacuum run (4 KiB each by default).
+SQLITE_INCREMENTAL_VACUUM_PAGES = int(os.getenv("SQLITE_INCREMENTAL_VACUUM_PAGES", "5000"))
+# Variants younger than this are left alone: the derivative job may still be racing an upload.
+_DERIVATIVE_GRACE = timedelta(hours=1)
+
+maintenance_logger = logging.getLogger("app.maintenance")
+
+
+async def purge_password_resets() -> Dict[str, int]:
+    # A code is useless once used or expired, and nothing reads it afterwards.
+    async with async_session_factory() as session:
+        result = await session.execute(
+            delete(PasswordReset).where(or_(PasswordReset.used.is_(True), PasswordReset.expires_at < datetime.now()))
+        )
+        await session.commit()
+    return {"deleted": result.rowcount}
+
+
+async def purge_admin_reset_requests() -> Dict[str, int]:
+    cutoff = datetime.now() - timedelta(days=ADMIN_RESET_RETENTION_DAYS)
+    async with async_session_factory() as session:
+        result = await session.execute(
+            delete(AdminResetRequest).where(
+                AdminResetRequest.status != "pending",
+                AdminResetRequest.completed_at < cutoff,
+            )
+        )
+        await session.commit()
+    return {"deleted": result.rowcount}
+
+
+async def purge_orphaned_image_derivatives() -> Dict[str, int]:
+    # Variants are shared by content hash, so they go only once no file has that content any more.
+    async with async_session_factory() as session:
+        result = await session.execute(
+            delete(ImageDerivative).where(
+                ImageDerivative.created_at < datetime.now() - _DERIVATIVE_GRACE,
+                ImageDerivative.content_hash.not_in(
+                    select(FileModel.content_hash).where(FileModel.content_hash.is_not(None))
+                ),
+            )
+        )
+        await session.commit()
+    return {"deleted": result.rowcount}
+
+
+async def incremental_vacuum() -> Dict[str, int]:
+    # Deleted rows leave free pages inside the SQLite file; incremental vacuum returns a bounded
+    # number of them per run instead of rewriting the whole file the way VACUUM does.
+    if engine.dialect.name != "sqlite":
+        return {}
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        mode = (await connection.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        if mode != 2:
+            # The switch needs a full VACUUM that blocks writes, so it is never done unattended.
+            maintenance_logger.warning(
+                "SQLite auto_vacuum is not INCREMENTAL; run python -m scripts.convert_auto_vacuum once",
+                extra={"fields": {"event": "vacuum_skipped", "auto_vacuum": mode}},
+            )
+            return {"converted": 0}
+        free_before = (await connection.exec_driver_sql("PRAGMA freelist_count")).scalar()
+        # The pragma frees one page per step and sqlite3's execute() steps once; executescript()
+        # runs it to completion.
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({SQLITE_INCREMENTAL_VACUUM_PAGES})")
+        free_after = (await connection.exec_driver_sql("PRAGMA freelist_count")).scalar()
+    return {"freed_pages": free_before - free_after, "free_pages": free_after}
+
+
+async def convert_to_incremental_vacuum() -> bool:
+    # Files created before auto_vacuum=INCREMENTAL was set need one full VACUUM to switch; it
+    # rewrites the whole file and blocks writers meanwhile, so run it in a maintenance window.
+    if engine.dialect.name != "sqlite":
+        return False
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if (await connection.exec_driver_sql("PRAGMA auto_vacuum")).scalar() == 2:
+            return False
+        await connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        await connection.exec_driver_sql("VACUUM")
+    return True
+
+
+def register_maintenance_jobs(scheduler: Scheduler) -> None:
+    scheduler.add("purge_password_resets", purge_password_resets, interval=15 * 60, jitter=60)
+    scheduler.add("purge_admin_reset_requests", purge_admin_reset_requests, cron="30 3 * * *", jitter=600)
+    scheduler.add("purge_image_derivatives", purge_orphaned_image_derivatives, cron="0 4 * * *", jitter=600)
+    # A first run on a large backlog can take a while; it resumes day by day if cut off.
+    scheduler.add("archive_chat_messages", archive_chat_messages, cron="15 3 * * *", jitter=600, timeout=1800)
+    # After the purges, so the pages they freed are returned the same night.
+    scheduler.add("incremental_vacuum", incremental_vacuum, cron="45 4 * * *", jitter=300, timeout=3600)
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence, Tuple
+
+from database import DEBUG, QueryStats, add_query_observer, current_query_stats, statement_operation
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+_INF_LABEL = 'le="+Inf"'
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        # Children are cached per label tuple; the hot path is one dict lookup.
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _ValueChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self, name: str, labelnames: Sequence[str], values: Sequence[str]) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name: str, labelnames: Sequence[str], values: Sequence[str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        cumulative += self.counts[-1]
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, _INF_LABEL)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being served.")
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, by statement type.", ("operation",))
+DB_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement type.", ("operation",), DB_LATENCY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements issued while serving one HTTP request.", ("route",), QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL while serving one HTTP request.", ("route",), DB_LATENCY_BUCKETS
+)
+WS_CONNECTIONS = Gauge("websocket_connections", "Open chat websocket connections.")
+WS_BROADCAST_LATENCY = Histogram("websocket_broadcast_seconds", "Time to fan one chat message out to every connection.")
+EMAIL_MESSAGES = Counter("email_messages_total", "Outbound email attempts by transport and outcome.", ("transport", "outcome"))
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke up a periodic timer.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag measurement.")
+LOOP_BLOCKS = Counter("event_loop_blocked_total", "Times the event loop was blocked longer than the threshold.")
+LOOP_BLOCK_DURATION = Histogram(
+    "event_loop_block_duration_seconds",
+    "Duration of detected event loop blocks.",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full.")
+TRACE_SPANS_DROPPED = Counter("trace_spans_dropped_total", "Finished spans dropped by a full queue or a failed export.")
+CACHE_REQUESTS = Counter("cache_requests_total", "Read cache lookups by result.", ("cache", "result"))
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries evicted to stay under the size cap.", ("cache",))
+CACHE_BYTES = Gauge("cache_bytes", "Approximate memory held by the read cache.", ("cache",))
+CACHE_ENTRIES = Gauge("cache_entries", "Entries held by the read cache.", ("cache",))
+IMAGE_DERIVATIVE_JOBS = Counter(
+    "image_derivative_jobs_total", "Image variant jobs by outcome (generated, skipped, failed).", ("outcome",)
+)
+IMAGE_DERIVATIVE_SECONDS = Histogram("image_derivative_seconds", "Time to decode and resize one image into all variants.")
+SCHEDULED_JOB_RUNS = Counter(
+    "scheduled_job_runs_total", "Background job runs by outcome (success, failed, timeout).", ("job", "outcome")
+)
+SCHEDULED_JOB_SECONDS = Histogram("scheduled_job_duration_seconds", "Background job run time.", ("job",))
+SCHEDULED_JOB_LAST_SUCCESS = Gauge(
+    "scheduled_job_last_success_timestamp_seconds", "Unix time of the last successful run of each job.", ("job",)
+)
+CHAT_MESSAGES_ARCHIVED = Counter("chat_messages_archived_total", "Chat messages moved from the database to archive segments.")
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Coalesced reads: 'leader' ran the load, 'shared' joined one already in flight.",
+    ("name", "outcome"),
+)
+
+
+def _observe_query(statement: str, elapsed: float) -> None:
+    operation = statement_operation(statement)
+    DB_QUERIES.labels(operation).inc()
+    DB_LATENCY.labels(operation).observe(elapsed)
+
+
+add_query_observer(_observe_query)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: no extra task per request, and streaming bodies pass straight through.
+    # It also owns the per-request QueryStats that the engine hooks in database.py fill in.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = current_query_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if DEBUG:
+                    # Only queries issued before the headers go out are counted here.
+                    app_ms = (time.perf_counter() - started) * 1000
+                    db_ms = stats.db_time * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.queries).encode("latin-1")))
+                    headers.append((
+                        b"server-timing",
+                        f'db;dur={db_ms:.2f};desc="{stats.queries} queries", app;dur={app_ms:.2f}'.encode("latin-1"),
+                    ))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            current_query_stats.reset(token)
+            # The route template keeps label cardinality bounded (no ids in paths).
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats.queries)
+            DB_TIME_PER_REQUEST.labels(route).observe(stats.db_time)
@@ -0,0 +1,162 @@
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Request, Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "200"))
+# Totals are counted up to this many rows and cached briefly instead of running COUNT(*) per page.
+PAGE_COUNT_CAP = int(os.getenv("PAGE_COUNT_CAP", "10000"))
+PAGE_COUNT_TTL_SECONDS = float(os.getenv("PAGE_COUNT_TTL_SECONDS", "30"))
+
+PAGINATION_HEADERS = ["Link", "X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated"]
+
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        sort: Optional[str] = None,
+        order: str = Query("asc", pattern="^(asc|desc)$"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.order = order
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> List[Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    if (
+        not isinstance(values, list)
+        or len(values) != 4
+        or not all(isinstance(value, str) for value in values[:2])
+        or not isinstance(values[2], (str, int, float, type(None)))
+        or not isinstance(values[3], (str, int))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+class _CountCache:
+    def __init__(self) -> None:
+        self.entries: Dict[str, Tuple[float, int, bool]] = {}
+
+    async def get(self, session: AsyncSession, statement: Select) -> Tuple[int, bool]:
+        compiled = statement.compile()
+        key = f"{compiled}|{sorted(compiled.params.items())!r}"
+        now = time.monotonic()
+        cached = self.entries.get(key)
+        if cached and now - cached[0] < PAGE_COUNT_TTL_SECONDS:
+            return cached[1], cached[2]
+
+        bounded = statement.order_by(None).limit(PAGE_COUNT_CAP + 1).subquery()
+        count = (await session.execute(select(func.count()).select_from(bounded))).scalar_one()
+        estimated = count > PAGE_COUNT_CAP
+        total = min(count, PAGE_COUNT_CAP)
+        if len(self.entries) > 1024:
+            self.entries.clear()
+        self.entries[key] = (now, total, estimated)
+        return total, estimated
+
+
+count_cache = _CountCache()
+
+
+def _cursor_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _parse_cursor_value(column, value: Any) -> Any:
+    # The cursor came from the client: a value of the wrong type is rejected like a garbled token.
+    if value is None:
+        return value
+    try:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type in (int, float) and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return python_type(value)
+        if isinstance(value, python_type):
+            return value
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(
+    session: AsyncSession,
+    statement: Select,
+    params: PageParams,
+    sort_columns: Dict[str, Any],
+    default_sort: str,
+    id_column,
+    request: Request,
+    response: Response,
+    to_dict: Callable[[Any], Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    sort = params.sort or default_sort
+    sort_column = sort_columns.get(sort)
+    if sort_column is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field; use one of: {', '.join(sort_columns)}")
+    descending = params.order == "desc"
+
+    total, estimated = await count_cache.get(session, statement)
+
+    page_statement = statement
+    if params.cursor:
+        cursor_sort, cursor_order, last_value, last_id = decode_cursor(params.cursor)
+        if cursor_sort != sort or cursor_order != params.order:
+            raise HTTPException(status_code=400, detail="Cursor does not match sort and order")
+        last_value = _parse_cursor_value(sort_column, last_value)
+        last_id = _parse_cursor_value(id_column, last_id)
+        if descending:
+            page_statement = page_statement.where(
+                or_(sort_column < last_value, and_(sort_column == last_value, id_column < last_id))
+            )
+        else:
+            page_statement = page_statement.where(
+                or_(sort_column > last_value, and_(sort_column == last_value, id_column > last_id))
+            )
+
+    if descending:
+        page_statement = page_statement.order_by(sort_column.desc(), id_column.desc())
+    else:
+        page_statement = page_statement.order_by(sort_column.asc(), id_column.asc())
+
+    result = await session.execute(page_statement.limit(params.limit + 1))
+    rows = list(result.scalars().all())
+
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Count-Estimated"] = "true" if estimated else "false"
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        token = encode_cursor([
+            sort,
+            params.order,
+            _cursor_value(getattr(last, sort_column.key)),
+            getattr(last, id_column.key),
+        ])
+        response.headers["X-Next-Cursor"] = token
+        next_url = request.url.include_query_params(cursor=token)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return [to_dict(row) for row in rows]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from loop_monitor import loop_monitor
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_MIN_INTERVAL_MS = 1.0
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_PATH_PREFIXES = tuple(
+    sorted(
+        {
+            path + os.sep
+            for path in (_BACKEND_DIR, sysconfig.get_paths().get("purelib"), sysconfig.get_paths().get("stdlib"))
+            if path
+        },
+        key=len,
+        reverse=True,
+    )
+)
+# A loop thread parked in select() is idle, not busy; those samples are dropped unless asked for.
+_IDLE_FRAMES = {("selectors.py", "select")}
+
+_profile_lock = asyncio.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _collapse(frame, thread_name: Optional[str]) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    if thread_name:
+        labels.append(f"thread:{thread_name}")
+    return ";".join(reversed(labels))
+
+
+class _Sampler(threading.Thread):
+    # Polls sys._current_frames() from a side thread: nothing is installed into the profiled code.
+    def __init__(self, target_ids: Optional[Iterable[int]], interval: float, include_idle: bool) -> None:
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.target_ids = set(target_ids) if target_ids is not None else None
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.target_ids is not None and thread_id not in self.target_ids):
+                    continue
+                self.samples += 1
+                if not self.include_idle and _is_idle(frame):
+                    self.idle_samples += 1
+                    continue
+                thread_name = names.get(thread_id) if self.target_ids is None else None
+                self.stacks[_collapse(frame, thread_name)] += 1
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize_lag(lags: List[float]) -> Dict[str, Any]:
+    ordered = sorted(lags)
+    return {
+        "checks": len(ordered),
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+async def run_profile(
+    seconds: float,
+    interval_ms: float,
+    all_threads: bool = False,
+    include_idle: bool = False,
+) -> Dict[str, Any]:
+    if _profile_lock.locked():
+        raise ProfilerBusy("A profile is already running")
+    async with _profile_lock:
+        interval = max(interval_ms, PROFILER_MIN_INTERVAL_MS) / 1000
+        target_ids = None if all_threads else [threading.get_ident()]
+        sampler = _Sampler(target_ids, interval, include_idle)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            with loop_monitor.collect_lag() as lags:
+                await asyncio.sleep(seconds)
+        finally:
+            sampler.stop_event.set()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+
+        return {
+            "duration_s": round(time.perf_counter() - started, 3),
+            "interval_ms": interval * 1000,
+            "samples": sampler.samples,
+            "idle_samples": sampler.idle_samples,
+            "loop_lag": summarize_lag(lags),
+            "stacks": sampler.stacks,
+        }
+
+
+def collapsed_stacks(stacks: Counter) -> str:
+    # Brendan Gregg's folded format: "frame;frame;frame count", one stack per line.
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
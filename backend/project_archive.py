@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import posixpath
+import zipfile
+import zlib
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from database import File as FileModel, Project, async_session_factory
+from file_content import COMPRESSED_FILE_TYPES, decode_upload, iter_file_bytes
+
+MANIFEST_NAME = "project.json"
+_READ_CHUNK_BYTES = 64 * 1024
+PROJECT_IMPORT_MAX_BYTES = int(os.getenv("PROJECT_IMPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+PROJECT_IMPORT_MAX_FILES = int(os.getenv("PROJECT_IMPORT_MAX_FILES", "5000"))
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class _ChunkSink:
+    # Write-only, non-seekable target: zipfile falls back to data descriptors,
+    # and the archive is handed out piece by piece instead of being kept whole.
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _write_member(archive: zipfile.ZipFile, name: str, content: str, is_binary: bool, file_type: str) -> None:
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED if file_type.lower() in COMPRESSED_FILE_TYPES else zipfile.ZIP_DEFLATED
+    with archive.open(info, "w", force_zip64=True) as member:
+        for chunk in iter_file_bytes(content, is_binary):
+            member.write(chunk)
+
+
+async def iter_project_archive(project: Project) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, mode="w")
+    manifest: Dict[str, Any] = {
+        "name": project.name,
+        "description": project.description or "",
+        "files": [],
+    }
+
+    # The listing comes first and each file's content is then read in its own short session, so
+    # a slow download never keeps a read transaction (and SQLite's lock) open between members.
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(FileModel.id, FileModel.name, FileModel.file_type, FileModel.is_binary)
+            .where(FileModel.project_id == project.id)
+            .order_by(FileModel.created_at, FileModel.id)
+        )
+        listing = result.all()
+
+    for file_id, name, file_type, is_binary in listing:
+        async with async_session_factory() as session:
+            content = await session.scalar(select(FileModel.content).where(FileModel.id == file_id))
+        if content is None:
+            # Deleted while the archive was being written.
+            continue
+        # Compression runs off the event loop; one file's output is buffered at a time.
+        await run_in_threadpool(_write_member, archive, name, content, is_binary, file_type)
+        manifest["files"].append({"name": name, "file_type": file_type, "is_binary": is_binary})
+        yield sink.drain()
+
+    archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    archive.close()
+    yield sink.drain()
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, budget: List[int]) -> bytes:
+    # Sizes in the headers are whatever the archive claims; the limit is enforced on the bytes
+    # actually inflated, shared across members through budget[0].
+    data = bytearray()
+    try:
+        with archive.open(info) as member:
+            while chunk := member.read(_READ_CHUNK_BYTES):
+                budget[0] -= len(chunk)
+                if budget[0] < 0:
+                    raise ArchiveError(f"Archive expands to more than {PROJECT_IMPORT_MAX_BYTES} bytes")
+                data += chunk
+    except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as exc:
+        raise ArchiveError(f"{info.filename} is corrupt or uses an unsupported format") from exc
+    return bytes(data)
+
+
+def read_project_archive(fileobj: BinaryIO) -> Tuple[Dict[str, Any], List[Tuple[str, str, str, bool]]]:
+    # Returns (manifest, [(name, content, file_type, is_binary), ...]).
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as exc:
+        raise ArchiveError("Not a valid zip archive") from exc
+
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > PROJECT_IMPORT_MAX_FILES:
+            raise ArchiveError(f"Archive has more than {PROJECT_IMPORT_MAX_FILES} files")
+        # Quick reject on the declared sizes; _read_member enforces the limit for real.
+        if sum(info.file_size for info in members) > PROJECT_IMPORT_MAX_BYTES:
+            raise ArchiveError(f"Archive expands to more than {PROJECT_IMPORT_MAX_BYTES} bytes")
+        budget = [PROJECT_IMPORT_MAX_BYTES]
+
+        manifest: Dict[str, Any] = {}
+        if MANIFEST_NAME in archive.namelist():
+            raw_manifest = _read_member(archive, archive.getinfo(MANIFEST_NAME), budget)
+            try:
+                manifest = json.loads(raw_manifest)
+            except ValueError as exc:
+                raise ArchiveError(f"{MANIFEST_NAME} is not valid JSON") from exc
+            if not isinstance(manifest, dict) or not isinstance(manifest.get("files", []), list):
+                raise ArchiveError(f"{MANIFEST_NAME} must be an object with a \"files\" list")
+        declared: Dict[str, Dict[str, Any]] = {
+            entry.get("name"): entry for entry in manifest.get("files", []) if isinstance(entry, dict)
+        }
+
+        entries: List[Tuple[str, str, str, bool]] = []
+        for info in members:
+            if info.filename == MANIFEST_NAME:
+                continue
+            name = posixpath.normpath(info.filename).lstrip("/")
+            raw = _read_member(archive, info, budget)
+            content, file_type, is_binary = decode_upload(name, raw)
+            meta: Optional[Dict[str, Any]] = declared.get(info.filename)
+            if meta and meta.get("file_type"):
+                file_type = str(meta["file_type"])
+            if meta and meta.get("is_binary") and not is_binary:
+                content, is_binary = base64.b64encode(raw).decode("utf-8"), True
+            entries.append((name, content, file_type, is_binary))
+    return manifest, entries
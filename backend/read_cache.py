@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from itertools import count
+from typing import Hashable, List, Optional
+
+from metrics import CACHE_BYTES, CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS
+
+# One limit for all read caches together, not for each of them.
+READ_CACHE_MAX_BYTES = int(os.getenv("READ_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Bodies bigger than this are served from the database every time instead of crowding out the rest.
+READ_CACHE_MAX_ENTRY_BYTES = int(os.getenv("READ_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+# Rough per-entry bookkeeping cost (key, entry object, OrderedDict node) counted against the cap.
+_ENTRY_OVERHEAD = 200
+
+
+class CacheEntry:
+    __slots__ = ("value", "version", "tag", "etag", "size", "used")
+
+    def __init__(
+        self,
+        value: bytes,
+        version: Optional[str] = None,
+        tag: Optional[str] = None,
+        etag: Optional[str] = None,
+    ) -> None:
+        self.value = value
+        # The row's updated_at: a load that finishes late never replaces a newer entry.
+        self.version = version
+        self.tag = tag
+        self.etag = etag
+        self.size = len(value) + _ENTRY_OVERHEAD
+        # Position in the budget's use order, so entries of different caches can be compared.
+        self.used = 0
+
+
+class CacheBudget:
+    # Byte limit shared by several caches. When it is exceeded the least recently used entry
+    # goes, whichever cache holds it: each cache keeps its entries in use order, so the victim
+    # is the oldest of the caches' first entries.
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.caches: List["LRUCache"] = []
+        self._clock = count(1)
+
+    def touch(self, entry: CacheEntry) -> None:
+        entry.used = next(self._clock)
+
+    def evict(self) -> None:
+        while self.size > self.max_bytes:
+            victim = min((cache for cache in self.caches if cache._entries), key=lambda cache: cache.oldest().used)
+            victim.evict_oldest()
+
+
+shared_budget = CacheBudget(READ_CACHE_MAX_BYTES)
+
+
+class LRUCache:
+    # Serialized response bodies keyed by row id, bounded by total size rather than entry count.
+    # Only touched from the event loop, so there is no locking.
+    def __init__(self, name: str, budget: CacheBudget = shared_budget, max_entry_bytes: int = READ_CACHE_MAX_ENTRY_BYTES) -> None:
+        self.name = name
+        self.budget = budget
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        budget.caches.append(self)
+        # Bumped by every invalidation; a load only stores its result if no write landed meanwhile.
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_REQUESTS.labels(self.name, "miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        self.budget.touch(entry)
+        CACHE_REQUESTS.labels(self.name, "hit").inc()
+        return entry
+
+    def put(self, key: Hashable, entry: CacheEntry, generation: int) -> None:
+        if generation != self.generation or entry.size > min(self.max_entry_bytes, self.budget.max_bytes):
+            return
+        current = self._entries.get(key)
+        if current is not None:
+            if current.version and entry.version and current.version > entry.version:
+                return
+            self._remove(key)
+        self.budget.touch(entry)
+        self._entries[key] = entry
+        self.size += entry.size
+        self.budget.size += entry.size
+        self.budget.evict()
+        self._report()
+
+    def oldest(self) -> CacheEntry:
+        return next(iter(self._entries.values()))
+
+    def evict_oldest(self) -> None:
+        self._remove(next(iter(self._entries)))
+        CACHE_EVICTIONS.labels(self.name).inc()
+        self._report()
+
+    def invalidate(self, key: Hashable) -> None:
+        self.generation += 1
+        if key in self._entries:
+            self._remove(key)
+            self._report()
+
+    def invalidate_tag(self, tag: str) -> None:
+        self.generation += 1
+        for key in [key for key, entry in self._entries.items() if entry.tag == tag]:
+            self._remove(key)
+        self._report()
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.budget.size -= self.size
+        self.size = 0
+        self._report()
+
+    def _remove(self, key: Hashable) -> None:
+        size = self._entries.pop(key).size
+        self.size -= size
+        self.budget.size -= size
+
+    def _report(self) -> None:
+        CACHE_BYTES.labels(self.name).set(self.size)
+        CACHE_ENTRIES.labels(self.name).set(len(self._entries))
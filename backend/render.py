@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from markdown_it import MarkdownIt
+from pygments import __version__ as PYGMENTS_VERSION
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+# Part of every cache key and ETag: bump it when the rendered output changes for the same input.
+RENDERER_VERSION = 1
+RENDER_MAX_CHARS = int(os.getenv("RENDER_MAX_CHARS", "1000000"))
+RENDER_PYGMENTS_STYLE = os.getenv("RENDER_PYGMENTS_STYLE", "github-dark")
+HIGHLIGHT_CSS_CLASS = "highlight"
+MARKDOWN_FILE_TYPES = {"md", "markdown"}
+PLAIN_TEXT = "text"
+
+
+@lru_cache(maxsize=256)
+def lexer_alias(file_type: str, filename: str) -> str:
+    # Tried by file type first (it is usually the extension), then by the full name for types
+    # Pygments only knows by pattern (yml, kt, Dockerfile, ...).
+    for lookup in (lambda: get_lexer_by_name(file_type), lambda: get_lexer_for_filename(filename)):
+        try:
+            return lookup().aliases[0]
+        except ClassNotFound:
+            continue
+    return PLAIN_TEXT
+
+
+def render_target(file_type: str, filename: str) -> Tuple[str, str]:
+    # (format, language): markdown is rendered to HTML, everything else is highlighted as code.
+    file_type = (file_type or "").lower()
+    if file_type in MARKDOWN_FILE_TYPES:
+        return "markdown", "markdown"
+    return "code", lexer_alias(file_type, filename or "")
+
+
+def highlight_code(code: str, language: Optional[str]) -> str:
+    try:
+        lexer = get_lexer_by_name(language or PLAIN_TEXT, stripnl=False)
+    except ClassNotFound:
+        lexer = get_lexer_by_name(PLAIN_TEXT, stripnl=False)
+    body = highlight(code, lexer, HtmlFormatter(nowrap=True))
+    # data-language rather than a language-* class: Prism on the page would re-highlight those.
+    return f'<pre class="{HIGHLIGHT_CSS_CLASS}" data-language="{html.escape(lexer.aliases[0])}"><code>{body}</code></pre>\n'
+
+
+def _highlight_fence(code: str, language: str, attrs: str) -> str:
+    # Returning markup that starts with <pre> tells markdown-it to use it as the whole block.
+    return highlight_code(code, language.strip() or None)
+
+
+# html=False escapes raw HTML in the source, and markdown-it's link validation already drops
+# javascript:/vbscript:/file: URLs, so the output is safe to insert as-is.
+_markdown = MarkdownIt("commonmark", {"html": False, "breaks": True, "highlight": _highlight_fence}).enable(
+    ["table", "strikethrough"]
+)
+
+
+def render_html(content: str, fmt: str, language: str) -> str:
+    if fmt == "markdown":
+        return _markdown.render(content)
+    return highlight_code(content, language)
+
+
+@lru_cache(maxsize=1)
+def highlight_css() -> Tuple[str, str]:
+    # (stylesheet, etag) for the classes emitted by highlight_code().
+    prefix = f".{HIGHLIGHT_CSS_CLASS}"
+    # get_style_defs() also emits unscoped pre/td rules; only the scoped ones are kept.
+    rules = HtmlFormatter(style=RENDER_PYGMENTS_STYLE).get_style_defs(prefix).splitlines()
+    css = "\n".join(rule for rule in rules if rule.startswith(prefix)) + "\n"
+    etag = '"' + hashlib.sha256(f"{PYGMENTS_VERSION}:{css}".encode("utf-8")).hexdigest()[:16] + '"'
+    return css, etag
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from database import File as FileModel, FileRevision, compute_content_hash
+from text_patch import RangeEdit, apply_range_edits, compute_range_edits
+
+# Every Nth revision is stored in full so reconstruction replays at most N - 1 deltas.
+FILE_REVISION_SNAPSHOT_INTERVAL = int(os.getenv("FILE_REVISION_SNAPSHOT_INTERVAL", "20"))
+
+
+def revision_to_dict(revision: FileRevision) -> Dict[str, Any]:
+    return {
+        "file_id": revision.file_id,
+        "revision": revision.revision,
+        "kind": revision.kind,
+        "content_hash": revision.content_hash,
+        "size": revision.size,
+        "created_by": revision.created_by,
+        "created_at": revision.created_at.isoformat() if revision.created_at else None,
+    }
+
+
+async def _revision_heads(session: AsyncSession, file_id: str) -> Tuple[int, int]:
+    result = await session.execute(
+        select(
+            func.max(FileRevision.revision),
+            func.max(case((FileRevision.kind == "snapshot", FileRevision.revision))),
+        ).where(FileRevision.file_id == file_id)
+    )
+    latest, latest_snapshot = result.one()
+    return latest or 0, latest_snapshot or 0
+
+
+def _new_revision(
+    file_id: str,
+    number: int,
+    kind: str,
+    payload: str,
+    content: str,
+    created_by: Optional[str],
+    created_at: Optional[datetime] = None,
+) -> FileRevision:
+    return FileRevision(
+        id=str(uuid.uuid4()),
+        file_id=file_id,
+        revision=number,
+        kind=kind,
+        payload=payload,
+        content_hash=compute_content_hash(content),
+        size=len(content),
+        created_by=created_by,
+        created_at=created_at or datetime.now(),
+    )
+
+
+async def lock_file(session: AsyncSession, file_id: str) -> None:
+    # A no-op UPDATE of the file row takes the write lock (a row lock outside SQLite), so
+    # whatever the transaction reads about the file afterwards cannot change under it until
+    # commit. Saves of one file therefore check, number and diff their revisions one at a time.
+    files = FileModel.__table__
+    await session.execute(update(files).where(files.c.id == file_id).values(updated_at=files.c.updated_at))
+
+
+async def record_revision(
+    session: AsyncSession,
+    file_obj: FileModel,
+    created_by: Optional[str],
+    previous_content: Optional[str] = None,
+    edits: Optional[List[RangeEdit]] = None,
+) -> FileRevision:
+    # Stages a revision for file_obj's current content; the caller commits.
+    await lock_file(session, file_obj.id)
+    latest, latest_snapshot = await _revision_heads(session, file_obj.id)
+
+    if latest == 0 and previous_content is not None:
+        # File predates revision tracking: keep the content being replaced as revision 1.
+        session.add(_new_revision(
+            file_obj.id, 1, "snapshot", previous_content, previous_content, None, file_obj.created_at,
+        ))
+        latest = latest_snapshot = 1
+
+    number = latest + 1
+    content = file_obj.content
+    kind, payload = "snapshot", content
+    if previous_content is not None and latest:
+        # A delta is only valid against the stored head. previous_content was read by the caller,
+        # possibly before another save committed; if it is not the head any more, store in full.
+        head_hash = await session.scalar(
+            select(FileRevision.content_hash).where(FileRevision.file_id == file_obj.id, FileRevision.revision == latest)
+        )
+        if head_hash != compute_content_hash(previous_content):
+            previous_content = None
+    if previous_content is not None and not file_obj.is_binary and number - latest_snapshot < FILE_REVISION_SNAPSHOT_INTERVAL:
+        if edits is None:
+            edits = await run_in_threadpool(compute_range_edits, previous_content, content)
+        delta = json.dumps(edits, ensure_ascii=False, separators=(",", ":"))
+        if len(delta) < len(content) // 2:
+            kind, payload = "delta", delta
+
+    revision = _new_revision(file_obj.id, number, kind, payload, content, created_by)
+    session.add(revision)
+    return revision
+
+
+def initial_revision_rows(file_rows: List[Dict[str, Any]], created_by: Optional[str]) -> List[Dict[str, Any]]:
+    # Revision 1 snapshots for files inserted in bulk, as parameter dicts for insert(FileRevision).
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "file_id": row["id"],
+            "revision": 1,
+            "kind": "snapshot",
+            "payload": row["content"],
+            "content_hash": row["content_hash"],
+            "size": len(row["content"]),
+            "created_by": created_by,
+            "created_at": row["created_at"],
+        }
+        for row in file_rows
+    ]
+
+
+def revisions_statement(file_id: str) -> Select:
+    # Metadata only: payloads stay in the database, a history page never needs them.
+    return (
+        select(FileRevision)
+        .options(load_only(
+            FileRevision.id,
+            FileRevision.file_id,
+            FileRevision.revision,
+            FileRevision.kind,
+            FileRevision.content_hash,
+            FileRevision.size,
+            FileRevision.created_by,
+            FileRevision.created_at,
+        ))
+        .where(FileRevision.file_id == file_id)
+    )
+
+
+async def reconstruct_revision(session: AsyncSession, file_id: str, number: int) -> Optional[Tuple[FileRevision, str]]:
+    snapshot_result = await session.execute(
+        select(func.max(FileRevision.revision)).where(
+            FileRevision.file_id == file_id,
+            FileRevision.kind == "snapshot",
+            FileRevision.revision <= number,
+        )
+    )
+    snapshot_number = snapshot_result.scalar_one_or_none()
+    if snapshot_number is None:
+        return None
+
+    result = await session.execute(
+        select(FileRevision)
+        .where(
+            FileRevision.file_id == file_id,
+            FileRevision.revision >= snapshot_number,
+            FileRevision.revision <= number,
+        )
+        .order_by(FileRevision.revision)
+    )
+    chain = list(result.scalars().all())
+    if not chain or chain[-1].revision != number:
+        return None
+
+    content = chain[0].payload
+    for revision in chain[1:]:
+        content = apply_range_edits(content, [tuple(edit) for edit in json.loads(revision.payload)])
+    return chain[-1], content
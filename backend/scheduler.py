@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import insert, or_, update
+
+from database import ScheduledJob, async_session_factory, env_flag
+from metrics import SCHEDULED_JOB_LAST_SUCCESS, SCHEDULED_JOB_RUNS, SCHEDULED_JOB_SECONDS
+from tracing import start_trace
+
+SCHEDULER_ENABLED = env_flag("SCHEDULER_ENABLED", True)
+# Longest a process sleeps before looking at a job row again, so a schedule moved forward by
+# another process (or by hand) is noticed without a restart.
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "60"))
+# A lease outlives the job's timeout by this much, so it never expires under a job still running.
+_LEASE_MARGIN = timedelta(seconds=30)
+_MAX_ERROR_CHARS = 2000
+
+job_logger = logging.getLogger("app.scheduler")
+
+JobFunc = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for item in field.split(","):
+        spec, _, step_text = item.partition("/")
+        step = int(step_text) if step_text else 1
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start_text, end_text = spec.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(spec)
+            end = high if step_text else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    # Standard five fields (minute hour day-of-month month day-of-week) in server local time;
+    # day-of-week 0 and 7 are both Sunday. Lists, ranges and steps are supported, names are not.
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} must have five fields")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = frozenset(day % 7 for day in _parse_cron_field(fields[4], 0, 7))
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # As in cron: when both day fields are restricted, matching either one is enough.
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skips whole months, days and hours that cannot match instead of walking minute by minute.
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        func: JobFunc,
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        timeout: float = 300.0,
+    ) -> None:
+        if (interval is None) == (cron is None):
+            raise ValueError(f"Job {name!r} needs exactly one of interval or cron")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron is not None else None
+        # Spreads runs out so jobs sharing a schedule (or many deployments of this app) do not
+        # all hit the database in the same second.
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def next_run(self, after: datetime) -> datetime:
+        if self.cron is not None:
+            base = self.cron.next_after(after)
+        else:
+            base = after + timedelta(seconds=self.interval)
+        return base + timedelta(seconds=random.uniform(0, self.jitter))
+
+
+class Scheduler:
+    # Every server process runs the same loop for every job, but a run starts only after taking
+    # the job's row lease in the database, so each due run happens in exactly one process.
+    def __init__(self) -> None:
+        self.jobs: Dict[str, Job] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, name: str, func: JobFunc, **options: Any) -> Job:
+        job = Job(name, func, **options)
+        self.jobs[name] = job
+        return job
+
+    async def start(self) -> None:
+        if not SCHEDULER_ENABLED or self._tasks:
+            return
+        for job in self.jobs.values():
+            await self._register(job)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._loop(job), name=f"job:{job.name}") for job in self.jobs.values()]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _register(self, job: Job) -> None:
+        # The first process to see a job schedules its first run; later ones keep that schedule.
+        async with async_session_factory() as session:
+            await session.execute(
+                insert(ScheduledJob).prefix_with("OR IGNORE", dialect="sqlite"),
+                [{"name": job.name, "next_run_at": job.next_run(datetime.now())}],
+            )
+            await session.commit()
+
+    async def _loop(self, job: Job) -> None:
+        while True:
+            try:
+                wake_at = await self._run_if_due(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                job_logger.exception("Scheduler check failed for job %s", job.name)
+                wake_at = None
+            delay = SCHEDULER_POLL_SECONDS
+            if wake_at is not None:
+                delay = min(max((wake_at - datetime.now()).total_seconds(), 1.0), SCHEDULER_POLL_SECONDS)
+            await asyncio.sleep(delay)
+
+    async def _run_if_due(self, job: Job) -> Optional[datetime]:
+        # Returns when this job is next worth looking at.
+        now = datetime.now()
+        async with async_session_factory() as session:
+            result = await session.execute(
+                update(ScheduledJob)
+                .where(
+                    ScheduledJob.name == job.name,
+                    ScheduledJob.next_run_at <= now,
+                    or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now),
+                )
+                .values(
+                    locked_by=self.owner,
+                    locked_until=now + timedelta(seconds=job.timeout) + _LEASE_MARGIN,
+                    last_started_at=now,
+                )
+            )
+            await session.commit()
+            if result.rowcount != 1:
+                row = await session.get(ScheduledJob, job.name)
+                if row is None:
+                    await self._register(job)
+                    return None
+                return max(row.next_run_at, row.locked_until or row.next_run_at)
+
+        try:
+            status, error = await self._execute(job)
+        except asyncio.CancelledError:
+            # Shutting down mid-run: give the lease back so another process picks the run up.
+            await self._release(job, {"locked_by": None, "locked_until": None})
+            raise
+        finished = datetime.now()
+        next_run_at = job.next_run(finished)
+        await self._release(
+            job,
+            {
+                "next_run_at": next_run_at,
+                "locked_by": None,
+                "locked_until": None,
+                "last_finished_at": finished,
+                "last_status": status,
+                "last_error": error,
+            },
+        )
+        return next_run_at
+
+    async def _execute(self, job: Job) -> Tuple[str, Optional[str]]:
+        status, error, summary, exc_info = "success", None, None, None
+        started = time.perf_counter()
+        with start_trace(f"job {job.name}", kind="internal", **{"job.name": job.name}):
+            try:
+                summary = await asyncio.wait_for(job.func(), job.timeout)
+            except asyncio.TimeoutError:
+                status, error = "timeout", f"Timed out after {job.timeout:g}s"
+            except Exception as exc:
+                status, error = "failed", f"{type(exc).__name__}: {exc}"[:_MAX_ERROR_CHARS]
+                exc_info = exc
+        elapsed = time.perf_counter() - started
+
+        SCHEDULED_JOB_RUNS.labels(job.name, status).inc()
+        SCHEDULED_JOB_SECONDS.labels(job.name).observe(elapsed)
+        if status == "success":
+            SCHEDULED_JOB_LAST_SUCCESS.labels(job.name).set(time.time())
+        record = {"event": "job", "job": job.name, "status": status, "duration_ms": round(elapsed * 1000, 2)}
+        if summary:
+            record["result"] = summary
+        if error:
+            record["error"] = error
+        job_logger.log(
+            logging.INFO if status == "success" else logging.WARNING,
+            "Job %s %s in %.1f ms",
+            job.name,
+            status,
+            record["duration_ms"],
+            exc_info=exc_info,
+            extra={"fields": record},
+        )
+        return status, error
+
+    async def _release(self, job: Job, values: Dict[str, Any]) -> None:
+        async with async_session_factory() as session:
+            await session.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.name == job.name, ScheduledJob.locked_by == self.owner)
+                .values(**values)
+            )
+            await session.commit()
+
+
+scheduler = Scheduler()
@@ -0,0 +1,387 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_DIR = BACKEND_DIR / "benchmarks"
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN = "seed_user_0000000"
+# Only these are passed through from the caller; everything the app reads is set explicitly in
+# _bench_env(), so a shell's DATABASE_URL, TRACE_FILE, CHAT_ARCHIVE_DIR etc. never leak into a run.
+_PASSTHROUGH_ENV = ("PATH", "HOME", "LANG", "LC_ALL", "TMPDIR", "SYSTEMROOT", "VIRTUAL_ENV", "PYTHONPATH")
+SCENARIOS = ("login", "list_projects", "project_detail", "file_upload", "file_download", "ws_chat")
+
+
+class BenchContext:
+    def __init__(self, client: httpx.AsyncClient, base_url: str, rng: random.Random) -> None:
+        self.client = client
+        self.base_url = base_url
+        self.rng = rng
+        self.token = ""
+        self.project_ids: List[str] = []
+        self.file_ids: List[str] = []
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> Dict[str, Optional[float]]:
+    # Linux only; elsewhere memory is reported as unknown rather than guessed.
+    values: Dict[str, Optional[float]] = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    values["rss_mb"] = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    values["peak_rss_mb"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    summary: Dict[str, Any] = {
+        "requests": len(ordered) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    if len(ordered) >= 2:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+        summary.update({
+            "p50_ms": round(cuts[49] * 1000, 2),
+            "p95_ms": round(cuts[94] * 1000, 2),
+            "p99_ms": round(cuts[98] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        })
+    return summary
+
+
+async def _run_requests(
+    requests_total: int,
+    concurrency: int,
+    call: Callable[[BenchContext], Awaitable[httpx.Response]],
+    ctx: BenchContext,
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests_total
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await call(ctx)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def _login(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.post("/api/auth/login", json={"username": BENCH_ADMIN, "password": BENCH_PASSWORD})
+
+
+async def _list_projects(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get("/api/projects", params={"limit": 50})
+
+
+async def _project_detail(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"/api/projects/{ctx.rng.choice(ctx.project_ids)}")
+
+
+async def _file_upload(ctx: BenchContext) -> httpx.Response:
+    body = ("".join(ctx.rng.choices("abcdef0123456789\n", k=4096))).encode("utf-8")
+    response = await ctx.client.post(
+        "/api/files/upload",
+        data={"project_id": ctx.rng.choice(ctx.project_ids)},
+        files={"file": (f"bench_{ctx.rng.getrandbits(32):08x}.txt", body, "text/plain")},
+    )
+    if response.status_code == 200:
+        ctx.file_ids.append(response.json()["id"])
+    return response
+
+
+async def _file_download(ctx: BenchContext) -> httpx.Response:
+    return await ctx.client.get(f"/api/files/{ctx.rng.choice(ctx.file_ids)}")
+
+
+async def _ws_chat(ctx: BenchContext, clients: int, messages: int) -> Dict[str, Any]:
+    # Closed loop: every client sends, waits for its own broadcast, then sends the next message.
+    # Latency is send-to-echo, which covers the insert, commit and fan-out to all clients.
+    ws_url = ctx.base_url.replace("http", "ws", 1) + f"/api/ws/chat?token={ctx.token}"
+    latencies: List[float] = []
+    errors = 0
+    finished = asyncio.Event()
+    pending = clients
+
+    async def client(index: int) -> None:
+        nonlocal errors, pending
+        try:
+            async with websockets.connect(ws_url, max_size=None) as ws:
+                json.loads(await ws.recv())  # history
+                await ready.wait()
+                for seq in range(messages):
+                    marker = f"bench-{index}-{seq}"
+                    started = time.perf_counter()
+                    await ws.send(json.dumps({"message": marker}))
+                    while True:
+                        event = json.loads(await ws.recv())
+                        if event.get("type") == "message" and event["data"]["message"] == marker:
+                            latencies.append(time.perf_counter() - started)
+                            break
+                pending -= 1
+                if pending == 0:
+                    finished.set()
+                # Keep reading so the server never blocks on this socket while others finish.
+                while not finished.is_set():
+                    try:
+                        await asyncio.wait_for(ws.recv(), timeout=0.1)
+                    except asyncio.TimeoutError:
+                        pass
+        except (OSError, websockets.WebSocketException):
+            errors += 1
+            pending -= 1
+            if pending == 0:
+                finished.set()
+
+    ready = asyncio.Event()
+    tasks = [asyncio.create_task(client(index)) for index in range(clients)]
+    await asyncio.sleep(0.5)
+    started = time.perf_counter()
+    ready.set()
+    await finished.wait()
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    summary = _summarize(latencies, errors * messages, elapsed)
+    summary["clients"] = clients
+    summary["deliveries"] = len(latencies) * clients
+    return summary
+
+
+def _seed_database(env: Dict[str, str], args: argparse.Namespace) -> None:
+    subprocess.run(
+        [
+            sys.executable, "-m", "scripts.seed",
+            "--seed", str(args.seed),
+            "--users", str(args.users),
+            "--projects", str(args.projects),
+            "--files-per-project", str(args.files_per_project),
+            "--file-size", str(args.file_size),
+            "--messages", str(args.messages),
+            "--password", BENCH_PASSWORD,
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def _wait_until_up(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy in time")
+
+
+def _bench_env(tmp: Path) -> Dict[str, str]:
+    # Values set here also win over backend/.env: load_dotenv() never overrides what is already set.
+    env = {key: os.environ[key] for key in _PASSTHROUGH_ENV if key in os.environ}
+    env.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp / 'bench.db'}",
+        "SECRET_KEY": "benchmark-secret",
+        "SMTP_HOST": "",
+        "CHAT_ARCHIVE_DIR": str(tmp / "chat_archive"),
+        "SCHEDULER_ENABLED": "false",
+        "DEBUG": "false",
+        "LOG_LEVEL": "INFO",
+        "ACCESS_LOG": "true",
+        "LOG_SAMPLE_RATES": "/api/health=0.01",
+        "TRACE_EXPORTER": "none",
+        "TRACE_FILE": str(tmp / "traces.jsonl"),
+        "METRICS_TOKEN": "",
+        "PYTHONHASHSEED": "0",
+    })
+    return env
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    selected = args.scenarios or list(SCENARIOS)
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        env = _bench_env(Path(tmp))
+        _seed_database(env, args)
+
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR,
+            env=env,
+            # The JSON app logs stay on (their cost is part of the measurement) but are not shown.
+            stdout=subprocess.DEVNULL,
+        )
+        results: Dict[str, Any] = {}
+        try:
+            await _wait_until_up(base_url, process)
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+                ctx = BenchContext(client, base_url, random.Random(args.seed))
+                login = await _login(ctx)
+                login.raise_for_status()
+                ctx.token = login.json()["access_token"]
+                client.headers["Authorization"] = f"Bearer {ctx.token}"
+                ctx.project_ids = [project["id"] for project in (await client.get("/api/projects", params={"limit": 200})).json()]
+                for project_id in ctx.project_ids[:5]:
+                    detail = (await client.get(f"/api/projects/{project_id}")).json()
+                    ctx.file_ids.extend(file["id"] for file in detail.get("files", []))
+                results["_startup"] = _rss_mb(process.pid)
+
+                calls = {
+                    "login": _login,
+                    "list_projects": _list_projects,
+                    "project_detail": _project_detail,
+                    "file_upload": _file_upload,
+                    "file_download": _file_download,
+                }
+                for name in selected:
+                    if name == "ws_chat":
+                        summary = await _ws_chat(ctx, args.ws_clients, args.ws_messages)
+                    else:
+                        # bcrypt makes logins orders of magnitude slower; keep that scenario short.
+                        total = min(args.requests, args.login_requests) if name == "login" else args.requests
+                        summary = await _run_requests(total, args.concurrency, calls[name], ctx)
+                    summary.update(_rss_mb(process.pid))
+                    results[name] = summary
+                    _print_row(name, summary)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+        },
+        "results": results,
+    }
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+
+def _print_row(name: str, summary: Dict[str, Any]) -> None:
+    print(
+        f"{name:<15} n={summary['requests']:<6} err={summary['errors']:<4} "
+        f"rps={_fmt(summary['throughput_rps']):>8}  p50={_fmt(summary.get('p50_ms')):>7}ms  "
+        f"p95={_fmt(summary.get('p95_ms')):>7}ms  p99={_fmt(summary.get('p99_ms')):>7}ms  "
+        f"rss={_fmt(summary.get('rss_mb'))}MB"
+    )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: Optional[float]) -> bool:
+    # Returns False when any p95 got slower than the allowed regression (percent).
+    ok = True
+    print(f"\nCompared with baseline from {baseline['meta']['created_at']}:")
+    for name, summary in current["results"].items():
+        base = baseline["results"].get(name)
+        if name.startswith("_") or not base:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "rss_mb"):
+            if summary.get(key) is None or not base.get(key):
+                continue
+            delta = (summary[key] - base[key]) / base[key] * 100
+            parts.append(f"{key}={summary[key]:.1f} ({delta:+.1f}%)")
+            if key == "p95_ms" and max_regression is not None and delta > max_regression:
+                ok = False
+        print(f"{name:<15} " + "  ".join(parts))
+    return ok
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Boot the API against a temporary SQLite DB and measure it.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ws-clients", type=int, default=20)
+    parser.add_argument("--ws-messages", type=int, default=20, help="messages sent by each websocket client")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--files-per-project", type=int, default=10)
+    parser.add_argument("--file-size", type=int, default=2048)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--save", metavar="NAME", help=f"save results as {BASELINE_DIR.name}/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline")
+    parser.add_argument("--max-regression", type=float, help="exit non-zero if any p95 is slower by more than this percent")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run_benchmarks(args))
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nSaved baseline to {path}")
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text(encoding="utf-8"))
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import asyncio
+
+from database import engine
+from maintenance import convert_to_incremental_vacuum
+
+
+async def convert_auto_vacuum() -> None:
+    if await convert_to_incremental_vacuum():
+        print("Database switched to auto_vacuum=INCREMENTAL.")
+    else:
+        print("Nothing to do: not SQLite, or auto_vacuum is already INCREMENTAL.")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(convert_auto_vacuum())
@@ -1,7 +1,10 @@
 import asyncio
-import requests
 
-API_URL = "http://0.0.0.0:8001"
+from sqlalchemy import select
+
+from database import Project, async_session_factory, init_models
+from search import init_search_index
+from scripts.seed import add_files, find_admin_id
 
 ADVANCED_MARKDOWN = """# Расширенная поддержка Markdown
 
@@ -184,46 +187,28 @@ print("Код тоже может быть здесь!")
 """
 
 
-async def create_advanced_markdown():
-    # Login
-    response = requests.post(f"{API_URL}/api/auth/login", json={
-        "username": "remod3",
-        "password": "domer123"
-    })
-    
-    if response.status_code != 200:
-        print("Login failed!")
-        return
-    
-    token = response.json()["access_token"]
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    # Get first project
-    projects_response = requests.get(f"{API_URL}/api/projects", headers=headers)
-    projects = projects_response.json()
-    
-    if not projects:
-        print("No projects found!")
-        return
-    
-    project_id = projects[0]["id"]
-    print(f"Using project: {project_id}")
-
-    file_response = requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": "ADVANCED_MARKDOWN.md",
-            "content": ADVANCED_MARKDOWN,
-            "file_type": "md"
-        }
-    )
-    
-    if file_response.status_code == 200:
-        print("✅ Advanced Markdown file created successfully!")
-    else:
-        print(f"❌ Failed to create file: {file_response.text}")
+async def create_advanced_markdown() -> None:
+    await init_models()
+    await init_search_index()
+
+    async with async_session_factory() as session:
+        admin_id = await find_admin_id(session)
+        if not admin_id:
+            print("No admin user found! Run create_admin.py first.")
+            return
+
+        # Get first project
+        result = await session.execute(select(Project.id).order_by(Project.created_at).limit(1))
+        project_id = result.scalar_one_or_none()
+        if not project_id:
+            print("No projects found!")
+            return
+        print(f"Using project: {project_id}")
+
+        await add_files(session, project_id, admin_id, [("ADVANCED_MARKDOWN.md", ADVANCED_MARKDOWN, "md")])
+        await session.commit()
+
+    print("✅ Advanced Markdown file created successfully!")
 
 
 if __name__ == "__main__":
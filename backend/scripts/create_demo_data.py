@@ -1,33 +1,13 @@
 import asyncio
 
-import requests
-
-API_URL = "http://0.0.0.0:8001"
-
-
-async def create_demo_data():
-    response = requests.post(f"{API_URL}/api/auth/login", json={
-        "username": "remodik",
-        "password": "domer123"
-    })
-    print("STATUS", response.status_code)
-    print("TEXT", response.text)
-    print("JSON", response.json())
-    token = response.json()["access_token"]
-    headers = {"Authorization": f"Bearer {token}"}
-
-    project_response = requests.post(
-        f"{API_URL}/api/projects",
-        headers=headers,
-        json={
-            "name": "Demo Project",
-            "description": "A demonstration project with various file types"
-        }
-    )
-    print("PROJECT RESPONSE STATUS:", project_response.status_code)
-    print("PROJECT RESPONSE TEXT:", project_response.text)
-    project_id = project_response.json()["id"]
-    print(f"Created project: {project_id}")
+from database import async_session_factory, init_models
+from search import init_search_index
+from scripts.seed import add_project, find_admin_id
+
+
+async def create_demo_data() -> None:
+    await init_models()
+    await init_search_index()
 
     readme_content = """# Demo Project
 
@@ -59,18 +39,6 @@ def hello_world():
 2. Second
 3. Third
 """
-    
-    requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": "README.md",
-            "content": readme_content,
-            "file_type": "md"
-        }
-    )
-    print("Created README.md")
 
     python_content = """def fibonacci(n):
     \"\"\"Generate Fibonacci sequence up to n numbers\"\"\"
@@ -88,18 +56,6 @@ def main():
 if __name__ == "__main__":
     main()
 """
-    
-    requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": "fibonacci.py",
-            "content": python_content,
-            "file_type": "py"
-        }
-    )
-    print("Created fibonacci.py")
 
     js_content = """import React, { useState } from 'react';
 
@@ -121,18 +77,6 @@ const Counter = () => {
 
 export default Counter;
 """
-    
-    requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": "Counter.jsx",
-            "content": js_content,
-            "file_type": "jsx"
-        }
-    )
-    print("Created Counter.jsx")
 
     package_json = """{
   "name": "demo-project",
@@ -152,18 +96,6 @@ export default Counter;
   }
 }
 """
-    
-    requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": "package.json",
-            "content": package_json,
-            "file_type": "json"
-        }
-    )
-    print("Created package.json")
 
     gitignore_content = """node_modules/
 .env
@@ -173,19 +105,32 @@ dist/
 build/
 .cache/
 """
-    
-    requests.post(
-        f"{API_URL}/api/files",
-        headers=headers,
-        json={
-            "project_id": project_id,
-            "name": ".gitignore",
-            "content": gitignore_content,
-            "file_type": "gitignore"
-        }
-    )
-    print("Created .gitignore")
-    
+
+    files = [
+        ("README.md", readme_content, "md"),
+        ("fibonacci.py", python_content, "py"),
+        ("Counter.jsx", js_content, "jsx"),
+        ("package.json", package_json, "json"),
+        (".gitignore", gitignore_content, "gitignore"),
+    ]
+
+    async with async_session_factory() as session:
+        admin_id = await find_admin_id(session)
+        if not admin_id:
+            print("No admin user found! Run create_admin.py first.")
+            return
+        project_id = await add_project(
+            session,
+            admin_id,
+            "Demo Project",
+            "A demonstration project with various file types",
+            files,
+        )
+        await session.commit()
+
+    for name, _, _ in files:
+        print(f"Created {name}")
+
     print("\n✅ Demo data created successfully!")
     print(f"Project ID: {project_id}")
 
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy import DateTime, delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import (
+    AdminResetRequest,
+    ChatMessage,
+    File as FileModel,
+    FileRevision,
+    PasswordReset,
+    Project,
+    Service,
+    User,
+    async_session_factory,
+    compute_content_hash,
+    engine,
+    init_models,
+)
+from revisions import initial_revision_rows
+from search import index_file, index_project, init_search_index, rebuild_search_index, search_index_ready
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+SEED_EPOCH = datetime(2024, 1, 1)
+SEED_SPAN = timedelta(days=365)
+WORDS = (
+    "project file service chat message admin user deploy build release version module "
+    "function class import export request response database query index cache stream "
+    "проект файл сервис сообщение пользователь запрос ответ база данных индекс кеш "
+    "alpha beta gamma delta markdown python javascript fastapi sqlite react docker"
+).split()
+FILE_TYPES = ("md", "py", "js", "json", "txt")
+# Rows are deleted in this order so foreign keys never dangle.
+SEEDED_MODELS = (FileRevision, FileModel, Project, ChatMessage, PasswordReset, AdminResetRequest, Service, User)
+# Version 4 and RFC 4122 variant bits, as uuid.UUID(version=4) sets them.
+_UUID4_CLEAR = ~((0xF000 << 64) | (0xC000 << 48))
+_UUID4_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+class SeedGenerator:
+    # Everything derives from one Random instance, so the same seed gives the same dataset.
+    def __init__(self, seed: int, corpus_size: int = 1 << 20) -> None:
+        self.rng = random.Random(seed)
+        # Text is sliced out of one pre-generated corpus; building words per row is the slow part otherwise.
+        corpus = " ".join(self.rng.choices(WORDS, k=corpus_size // 6 + 1))
+        self.corpus = corpus[:corpus_size]
+
+    def uuid(self) -> str:
+        # Same string as str(uuid.UUID(int=..., version=4)), without building the object.
+        value = self.rng.getrandbits(128) & _UUID4_CLEAR | _UUID4_SET
+        digits = f"{value:032x}"
+        return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+    def text(self, size: int) -> str:
+        if size <= 0:
+            return ""
+        if size >= len(self.corpus):
+            return (self.corpus * (size // len(self.corpus) + 1))[:size]
+        start = self.rng.randrange(len(self.corpus) - size)
+        return self.corpus[start:start + size]
+
+    def timestamp(self, position: int, total: int) -> datetime:
+        # Spread rows over SEED_SPAN in insertion order, like real traffic would be.
+        return SEED_EPOCH + SEED_SPAN * (position / max(total, 1))
+
+
+async def insert_rows(session: AsyncSession, model, rows: Iterable[Dict[str, Any]], batch_size: int) -> int:
+    table = model.__table__
+    if engine.dialect.name == "sqlite":
+        return await _insert_rows_sqlite(session, table, rows)
+    # Core executemany on the table skips per-object ORM bookkeeping entirely.
+    batch: List[Dict[str, Any]] = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await session.execute(insert(table), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await session.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+async def _insert_rows_sqlite(session: AsyncSession, table, rows: Iterable[Dict[str, Any]]) -> int:
+    # One sqlite3 executemany over a generator of parameter rows, inside the session's transaction.
+    # SQLAlchemy's per-row parameter processing costs more than the inserts themselves, so it is
+    # skipped; rows must therefore carry every column, and datetimes are written in the same
+    # text format SQLAlchemy uses for SQLite.
+    columns = [column.name for column in table.columns]
+    datetime_positions = [index for index, column in enumerate(table.columns) if isinstance(column.type, DateTime)]
+    statement = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    count = 0
+
+    pick = itemgetter(*columns)
+
+    def tuples() -> Iterator[List[Any]]:
+        nonlocal count
+        for row in rows:
+            values = list(pick(row))
+            for position in datetime_positions:
+                if values[position] is not None:
+                    values[position] = values[position].isoformat(" ", "microseconds")
+            count += 1
+            yield values
+
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.executemany(statement, tuples())
+    return count
+
+
+async def add_files(
+    session: AsyncSession,
+    project_id: str,
+    created_by: str,
+    files: Sequence[Tuple[str, str, str]],
+) -> List[Dict[str, Any]]:
+    # Inserts (name, content, file_type) text files with their first revision and search entry.
+    now = datetime.now()
+    file_rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "name": name,
+            "content": content,
+            "content_hash": compute_content_hash(content),
+            "file_type": file_type,
+            "is_binary": False,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for name, content, file_type in files
+    ]
+    if file_rows:
+        await session.execute(insert(FileModel.__table__), file_rows)
+        await session.execute(insert(FileRevision.__table__), initial_revision_rows(file_rows, created_by))
+        for row in file_rows:
+            await index_file(session, FileModel(**row))
+    return file_rows
+
+
+async def add_project(
+    session: AsyncSession,
+    created_by: str,
+    name: str,
+    description: str,
+    files: Sequence[Tuple[str, str, str]] = (),
+) -> str:
+    project = Project(
+        id=str(uuid.uuid4()),
+        name=name,
+        description=description,
+        created_by=created_by,
+        created_at=datetime.now(),
+    )
+    session.add(project)
+    await session.flush()
+    await index_project(session, project)
+    await add_files(session, project.id, created_by, files)
+    return project.id
+
+
+async def find_admin_id(session: AsyncSession) -> Optional[str]:
+    result = await session.execute(
+        select(User.id).where(User.role == "admin").order_by(User.created_at).limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+def _user_rows(gen: SeedGenerator, count: int, password_hash: str) -> Iterator[Dict[str, Any]]:
+    for index in range(count):
+        yield {
+            "id": gen.uuid(),
+            "username": f"seed_user_{index:07d}",
+            "email": f"seed_user_{index:07d}@example.test",
+            "password_hash": password_hash,
+            "role": "admin" if index == 0 else "user",
+            "created_at": gen.timestamp(index, count),
+        }
+
+
+def _project_rows(gen: SeedGenerator, count: int, user_ids: List[str], description_size: int) -> Iterator[Dict[str, Any]]:
+    for index in range(count):
+        yield {
+            "id": gen.uuid(),
+            "name": f"Project {index:07d} {gen.text(24).strip()}",
+            "description": gen.text(description_size),
+            "created_by": gen.rng.choice(user_ids),
+            "created_at": gen.timestamp(index, count),
+        }
+
+
+def _file_rows(
+    gen: SeedGenerator,
+    project_ids: List[str],
+    files_per_project: int,
+    file_size: int,
+) -> Iterator[Dict[str, Any]]:
+    total = len(project_ids) * files_per_project
+    position = 0
+    for project_id in project_ids:
+        for index in range(files_per_project):
+            file_type = gen.rng.choice(FILE_TYPES)
+            # Sizes vary around the target so revisions and caches see a realistic mix.
+            content = gen.text(int(file_size * gen.rng.uniform(0.5, 1.5)))
+            created_at = gen.timestamp(position, total)
+            position += 1
+            yield {
+                "id": gen.uuid(),
+                "project_id": project_id,
+                "name": f"file_{index:05d}.{file_type}",
+                "content": content,
+                "content_hash": compute_content_hash(content),
+                "file_type": file_type,
+                "is_binary": False,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+
+
+def _message_rows(gen: SeedGenerator, count: int, users: List[Tuple[str, str]], message_size: int) -> Iterator[Dict[str, Any]]:
+    for index in range(count):
+        user_id, username = gen.rng.choice(users)
+        yield {
+            "id": gen.uuid(),
+            "user_id": user_id,
+            "username": username,
+            "message": gen.text(int(message_size * gen.rng.uniform(0.2, 1.8)) or 1),
+            "timestamp": gen.timestamp(index, count),
+        }
+
+
+def _service_rows(gen: SeedGenerator, count: int) -> Iterator[Dict[str, Any]]:
+    for index in range(count):
+        created_at = gen.timestamp(index, count)
+        yield {
+            "id": gen.uuid(),
+            "name": f"Service {index:05d}",
+            "description": gen.text(200),
+            "price": f"{gen.rng.randrange(1, 100) * 1000} руб.",
+            "estimated_time": f"{gen.rng.randrange(1, 8)} недель",
+            "payment_methods": "Банковская карта, PayPal",
+            "frameworks": ", ".join(gen.rng.sample(WORDS, 3)),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+async def seed(args: argparse.Namespace) -> None:
+    await init_models()
+    if not args.skip_search_index:
+        await init_search_index()
+
+    gen = SeedGenerator(args.seed)
+    # One bcrypt hash shared by every seeded account; hashing per user would dominate the run.
+    password_hash = pwd_context.hash(args.password)
+    counts: Dict[str, int] = {}
+    started = time.perf_counter()
+
+    async with async_session_factory() as session:
+        if engine.dialect.name == "sqlite":
+            # Seed data is disposable: skip fsyncs and keep the rollback journal in memory for the
+            # duration of this connection. Everything below commits as one transaction.
+            await session.execute(text("PRAGMA synchronous = OFF"))
+            await session.execute(text("PRAGMA journal_mode = MEMORY"))
+            # Random UUID keys land all over the primary-key B-trees; a page cache far above the
+            # 2 MB default keeps them in memory instead of re-reading pages for every row.
+            await session.execute(text("PRAGMA cache_size = -524288"))
+        if args.clear:
+            for model in SEEDED_MODELS:
+                await session.execute(delete(model))
+
+        users = list(_user_rows(gen, args.users, password_hash))
+        counts["users"] = await insert_rows(session, User, users, args.batch_size)
+        user_ids = [row["id"] for row in users]
+        user_names = [(row["id"], row["username"]) for row in users]
+        del users
+
+        if user_ids:
+            projects = list(_project_rows(gen, args.projects, user_ids, args.description_size))
+            counts["projects"] = await insert_rows(session, Project, projects, args.batch_size)
+            project_ids = [row["id"] for row in projects]
+            project_owners = {row["id"]: row["created_by"] for row in projects}
+            del projects
+
+            revisions = 0
+            files = 0
+            batch: List[Dict[str, Any]] = []
+            for row in _file_rows(gen, project_ids, args.files_per_project, args.file_size):
+                batch.append(row)
+                if len(batch) >= args.batch_size:
+                    files += await insert_rows(session, FileModel, batch, args.batch_size)
+                    if not args.skip_revisions:
+                        revisions += await _insert_revisions(session, batch, project_owners, args.batch_size)
+                    batch = []
+            if batch:
+                files += await insert_rows(session, FileModel, batch, args.batch_size)
+                if not args.skip_revisions:
+                    revisions += await _insert_revisions(session, batch, project_owners, args.batch_size)
+            counts["files"] = files
+            counts["file_revisions"] = revisions
+
+            counts["chat_messages"] = await insert_rows(
+                session, ChatMessage, _message_rows(gen, args.messages, user_names, args.message_size), args.batch_size
+            )
+        counts["services"] = await insert_rows(session, Service, _service_rows(gen, args.services), args.batch_size)
+        await session.commit()
+        inserted = time.perf_counter() - started
+
+        if search_index_ready():
+            await rebuild_search_index(session)
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table:>15}: {count}")
+    print(f"Inserted {total} rows in {inserted:.2f}s ({total / max(inserted, 1e-9):.0f} rows/s), total {elapsed:.2f}s")
+    if args.users:
+        print(f"Seeded users share the password '{args.password}'; seed_user_0000000 is an admin.")
+
+
+async def _insert_revisions(
+    session: AsyncSession,
+    file_rows: List[Dict[str, Any]],
+    project_owners: Dict[str, str],
+    batch_size: int,
+) -> int:
+    revisions = initial_revision_rows(file_rows, None)
+    for revision, row in zip(revisions, file_rows):
+        revision["created_by"] = project_owners[row["project_id"]]
+    return await insert_rows(session, FileRevision, revisions, batch_size)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fill the database with a deterministic synthetic dataset.")
+    parser.add_argument("--seed", type=int, default=1, help="random seed; the same seed produces the same rows")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--files-per-project", type=int, default=10)
+    parser.add_argument("--file-size", type=int, default=2048, help="average file size in characters")
+    parser.add_argument("--description-size", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--message-size", type=int, default=120, help="average chat message length")
+    parser.add_argument("--services", type=int, default=10)
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="files (with their revisions) generated per insert; on SQLite other tables go in one executemany each",
+    )
+    parser.add_argument("--clear", action="store_true", help="delete existing rows from the seeded tables first")
+    parser.add_argument("--skip-revisions", action="store_true", help="do not create initial file revisions")
+    parser.add_argument("--skip-search-index", action="store_true", help="do not rebuild the full-text index")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(parse_args()))
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import html
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import File as FileModel, Project, async_session_factory, engine
+
+SEARCH_MAX_LIMIT = 50
+search_logger = logging.getLogger("app.search")
+
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# search_docs maps FTS rowids to the row they index, so updates and deletes hit
+# the FTS table by rowid instead of scanning it.
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS search_docs (
+        rowid INTEGER PRIMARY KEY,
+        kind VARCHAR(10) NOT NULL,
+        ref_id VARCHAR(36) NOT NULL UNIQUE,
+        project_id VARCHAR(36) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_search_docs_project_id ON search_docs (project_id)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+)
+
+search_enabled = False
+
+
+def search_index_ready() -> bool:
+    return search_enabled
+
+
+async def init_search_index() -> None:
+    global search_enabled
+    if engine.dialect.name != "sqlite":
+        search_logger.warning("Full-text search requires SQLite FTS5; /api/search is disabled.")
+        return
+    try:
+        async with engine.begin() as conn:
+            for statement in _SCHEMA:
+                await conn.execute(text(statement))
+    except OperationalError as exc:
+        search_logger.warning("SQLite FTS5 is unavailable, /api/search is disabled: %s", exc)
+        return
+    search_enabled = True
+
+    async with async_session_factory() as session:
+        indexed = (await session.execute(text("SELECT COUNT(*) FROM search_docs"))).scalar_one()
+        if indexed == 0:
+            await rebuild_search_index(session)
+
+
+# A full rebuild is set-based: one INSERT ... SELECT per statement instead of four round trips
+# per document, so reindexing a seeded or migrated database takes seconds.
+_REBUILD = (
+    "DELETE FROM search_index",
+    "DELETE FROM search_docs",
+    "INSERT INTO search_docs (kind, ref_id, project_id) SELECT 'project', id, id FROM projects",
+    "INSERT INTO search_docs (kind, ref_id, project_id) SELECT 'file', id, project_id FROM files WHERE NOT is_binary",
+    """
+    INSERT INTO search_index (rowid, title, body)
+    SELECT search_docs.rowid, COALESCE(projects.name, ''), COALESCE(projects.description, '')
+    FROM search_docs JOIN projects ON projects.id = search_docs.ref_id
+    WHERE search_docs.kind = 'project'
+    """,
+    """
+    INSERT INTO search_index (rowid, title, body)
+    SELECT search_docs.rowid, COALESCE(files.name, ''), COALESCE(files.content, '')
+    FROM search_docs JOIN files ON files.id = search_docs.ref_id
+    WHERE search_docs.kind = 'file'
+    """,
+)
+
+
+async def rebuild_search_index(session: AsyncSession) -> None:
+    for statement in _REBUILD:
+        await session.execute(text(statement))
+    await session.commit()
+
+
+async def _remove_document(session: AsyncSession, ref_id: str) -> None:
+    await session.execute(
+        text("DELETE FROM search_index WHERE rowid IN (SELECT rowid FROM search_docs WHERE ref_id = :ref_id)"),
+        {"ref_id": ref_id},
+    )
+    await session.execute(text("DELETE FROM search_docs WHERE ref_id = :ref_id"), {"ref_id": ref_id})
+
+
+async def _index_document(
+    session: AsyncSession,
+    kind: str,
+    ref_id: str,
+    project_id: str,
+    title: str,
+    body: Optional[str],
+) -> None:
+    await _remove_document(session, ref_id)
+    result = await session.execute(
+        text("INSERT INTO search_docs (kind, ref_id, project_id) VALUES (:kind, :ref_id, :project_id) RETURNING rowid"),
+        {"kind": kind, "ref_id": ref_id, "project_id": project_id},
+    )
+    rowid = result.scalar_one()
+    await session.execute(
+        text("INSERT INTO search_index (rowid, title, body) VALUES (:rowid, :title, :body)"),
+        {"rowid": rowid, "title": title or "", "body": body or ""},
+    )
+
+
+async def index_project(session: AsyncSession, project: Project) -> None:
+    if search_enabled:
+        await _index_document(session, "project", project.id, project.id, project.name, project.description)
+
+
+async def index_file(session: AsyncSession, file_obj: FileModel) -> None:
+    if not search_enabled:
+        return
+    if file_obj.is_binary:
+        await _remove_document(session, file_obj.id)
+        return
+    await _index_document(session, "file", file_obj.id, file_obj.project_id, file_obj.name, file_obj.content)
+
+
+async def remove_file(session: AsyncSession, file_id: str) -> None:
+    if search_enabled:
+        await _remove_document(session, file_id)
+
+
+async def remove_project(session: AsyncSession, project_id: str) -> None:
+    if not search_enabled:
+        return
+    await session.execute(
+        text("DELETE FROM search_index WHERE rowid IN (SELECT rowid FROM search_docs WHERE project_id = :project_id)"),
+        {"project_id": project_id},
+    )
+    await session.execute(text("DELETE FROM search_docs WHERE project_id = :project_id"), {"project_id": project_id})
+
+
+def build_match_query(query: str) -> Optional[str]:
+    # Quote every token so user input can never be parsed as FTS5 syntax; the last one matches as a prefix.
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _highlight_html(value: str) -> str:
+    return html.escape(value).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+async def run_search(
+    session: AsyncSession,
+    query: str,
+    limit: int,
+    offset: int,
+    project_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    match = build_match_query(query)
+    results: List[Dict[str, Any]] = []
+    if match is None:
+        return {"query": query, "results": results, "limit": limit, "offset": offset, "has_more": False}
+
+    project_filter = "AND d.project_id = :project_id" if project_id else ""
+    rows = await session.execute(
+        text(
+            f"""
+            SELECT d.kind, d.ref_id, d.project_id,
+                   highlight(search_index, 0, :mark_start, :mark_end) AS title,
+                   snippet(search_index, 1, :mark_start, :mark_end, '…', 16) AS snippet,
+                   bm25(search_index, 10.0, 1.0) AS score
+            FROM search_index
+            JOIN search_docs d ON d.rowid = search_index.rowid
+            WHERE search_index MATCH :match {project_filter}
+            ORDER BY score
+            LIMIT :limit OFFSET :offset
+            """
+        ),
+        {
+            "match": match,
+            "mark_start": _MARK_START,
+            "mark_end": _MARK_END,
+            "project_id": project_id,
+            "limit": limit + 1,
+            "offset": offset,
+        },
+    )
+    for kind, ref_id, row_project_id, title, snippet, score in rows.all():
+        results.append({
+            "kind": kind,
+            "id": ref_id,
+            "project_id": row_project_id,
+            "title_html": _highlight_html(title),
+            "snippet_html": _highlight_html(snippet),
+            "score": -score,
+        })
+
+    has_more = len(results) > limit
+    return {
+        "query": query,
+        "results": results[:limit],
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+    }
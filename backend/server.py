@@ -1,48 +1,118 @@
 import asyncio
-import base64
+import json
+import logging
 import os
 import random
 import smtplib
 import string
+import time
 import uuid
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal, Tuple
 from contextlib import asynccontextmanager, suppress
 
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile, WebSocket, WebSocketDisconnect, status
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Query, Request, Response, UploadFile, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel, EmailStr
-from sqlalchemy import delete, or_, select, text, update
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import delete, func, insert, or_, select, text, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+from batch import BATCH_MAX_OPERATIONS, resolve_references
+from change_feed import change_feed, file_event_payload, patch_event_payload
+from chat_archive import archive_cutoff, archived_days, iter_archived, read_archived_before
+from conditional import PRIVATE_REVALIDATE_CACHE_CONTROL, etag_matches, not_modified, weak_etag
 from database import (
     AdminResetRequest,
     ChatMessage,
     File as FileModel,
+    DEBUG_HEADERS,
+    FileRevision,
     PasswordReset as PasswordResetModel,
     Project,
     Service,
     User,
     async_session_factory,
+    compute_content_hash,
+    env_flag,
     get_session,
     init_models,
 )
+from log_pipeline import AccessLogMiddleware, configure_logging, shutdown_logging
+from loop_monitor import loop_monitor
+from maintenance import register_maintenance_jobs
+from metrics import (
+    EMAIL_MESSAGES,
+    METRICS_CONTENT_TYPE,
+    METRICS_TOKEN,
+    WS_BROADCAST_LATENCY,
+    WS_CONNECTIONS,
+    MetricsMiddleware,
+    render_metrics,
+)
+from file_content import BULK_UPLOAD_MAX_FILES, IMAGE_FILE_TYPES, decode_upload, decode_uploads
+from image_derivatives import DERIVATIVE_CACHE_CONTROL, image_pipeline, load_derivative
+from image_variants import IMAGE_VARIANTS
+from pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, PAGINATION_HEADERS, PageParams, paginate
+from profiler import PROFILER_MAX_SECONDS, ProfilerBusy, collapsed_stacks, run_profile
+from project_archive import ArchiveError, iter_project_archive, read_project_archive
+from read_cache import CacheEntry, LRUCache
+from render import RENDER_MAX_CHARS, RENDERER_VERSION, highlight_css, render_html, render_target
+from revisions import (
+    initial_revision_rows,
+    lock_file,
+    reconstruct_revision,
+    record_revision,
+    revision_to_dict,
+    revisions_statement,
+)
+from scheduler import scheduler
+from search import (
+    SEARCH_MAX_LIMIT,
+    index_file,
+    index_project,
+    init_search_index,
+    remove_file,
+    remove_project,
+    run_search,
+    search_index_ready,
+)
+from single_flight import SingleFlight
+from static_site import register_spa
+from streaming import JSON_MEDIA_TYPE, stream_json_response, wants_ndjson
+from text_patch import PatchError, apply_range_edits, unified_diff_to_range_edits
+from tracing import TRACE_HEADERS, TracingMiddleware, shutdown_tracing, span, start_trace, start_tracing
 
 load_dotenv()
 
+email_logger = logging.getLogger("app.email")
+chat_logger = logging.getLogger("app.chat")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
+    start_tracing()
     await init_models()
+    await init_search_index()
+    loop_monitor.start()
+    register_maintenance_jobs(scheduler)
+    await scheduler.start()
     yield
+    await scheduler.stop()
+    await loop_monitor.stop()
+    await image_pipeline.shutdown()
+    shutdown_tracing()
+    shutdown_logging()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -53,7 +123,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=PAGINATION_HEADERS + DEBUG_HEADERS + TRACE_HEADERS,
 )
+app.add_middleware(AccessLogMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 ALGORITHM = "HS256"
@@ -69,14 +143,10 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 
 
-def _env_flag(name: str, default: str = "false") -> bool:
-    return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
-
-
-SMTP_USE_TLS = _env_flag("SMTP_USE_TLS", "true")
-SMTP_USE_SSL = _env_flag("SMTP_USE_SSL", "false")
-SMTP_VALIDATE_CERTS = _env_flag("SMTP_VALIDATE_CERTS", "true")
-SMTP_SUPPRESS_SEND = _env_flag("SMTP_SUPPRESS_SEND", "false")
+SMTP_USE_TLS = env_flag("SMTP_USE_TLS", True)
+SMTP_USE_SSL = env_flag("SMTP_USE_SSL")
+SMTP_VALIDATE_CERTS = env_flag("SMTP_VALIDATE_CERTS", True)
+SMTP_SUPPRESS_SEND = env_flag("SMTP_SUPPRESS_SEND")
 SMTP_TIMEOUT = int(os.getenv("SMTP_TIMEOUT", "30"))
 SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME")
 
@@ -112,20 +182,25 @@ class ConnectionManager:
                 "user_id": user_id,
                 "username": username
         })
+        WS_CONNECTIONS.set(len(self.active_connections))
 
     def disconnect(self, websocket: WebSocket) -> None:
         self.active_connections = [conn for conn in self.active_connections if conn["websocket"] != websocket]
+        WS_CONNECTIONS.set(len(self.active_connections))
 
     async def broadcast(self, message: dict) -> None:
+        started = time.perf_counter()
         disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection["websocket"].send_json(message)
-            except Exception:
-                disconnected.append(connection["websocket"])
+        with span("ws.broadcast", **{"ws.connections": len(self.active_connections)}):
+            for connection in self.active_connections:
+                try:
+                    await connection["websocket"].send_json(message)
+                except Exception:
+                    disconnected.append(connection["websocket"])
 
         for ws in disconnected:
             self.disconnect(ws)
+        WS_BROADCAST_LATENCY.observe(time.perf_counter() - started)
 
 
 manager = ConnectionManager()
@@ -180,6 +255,19 @@ class FileUpdate(BaseModel):
     content: Optional[str] = None
 
 
+class FileRangeEdit(BaseModel):
+    start: int
+    end: int
+    text: str = ""
+
+
+class FilePatch(BaseModel):
+    base_hash: str
+    edits: Optional[List[FileRangeEdit]] = None
+    diff: Optional[str] = None
+    name: Optional[str] = None
+
+
 class ChatMessagePayload(BaseModel):
     message: str
 
@@ -202,6 +290,64 @@ class ServiceUpdate(BaseModel):
     frameworks: Optional[str] = None
 
 
+class BatchOperation(BaseModel):
+    op: Literal[
+        "create_project",
+        "update_project",
+        "delete_project",
+        "create_file",
+        "update_file",
+        "delete_file",
+        "create_service",
+        "update_service",
+        "delete_service",
+    ]
+    id: Optional[str] = None
+    data: Dict[str, Any] = {}
+    ref: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+# (project_id, event, data) change-feed events, published only after the transaction commits.
+FeedEvents = List[Tuple[str, str, Dict[str, Any]]]
+
+
+# Every project/file write ends in publish_events(), so that is where cached and in-flight
+# reads are dropped.
+project_reads = SingleFlight("project_detail")
+project_cache = LRUCache("project_detail")
+file_cache = LRUCache("file")
+# Keyed by content hash, so entries never go stale and writes need not touch it.
+render_cache = LRUCache("rendered")
+render_reads = SingleFlight("rendered")
+
+
+def publish_events(events: FeedEvents) -> None:
+    for project_id, event, data in events:
+        project_cache.invalidate(project_id)
+        project_reads.forget(project_id)
+        if event.startswith("file_"):
+            file_cache.invalidate(data["id"])
+            if event in ("file_created", "file_updated") and is_image_file(data):
+                image_pipeline.schedule(data["id"], data["content_hash"])
+        elif event == "project_deleted":
+            file_cache.invalidate_tag(project_id)
+        change_feed.publish(project_id, event, data)
+        if event == "project_deleted":
+            change_feed.close(project_id)
+
+
+def is_image_file(file_data: Dict[str, Any]) -> bool:
+    return bool(file_data.get("is_binary")) and (file_data.get("file_type") or "").lower() in IMAGE_FILE_TYPES
+
+
+def json_body(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
 class ContactMessage(BaseModel):
     name: str
     email: EmailStr
@@ -211,11 +357,13 @@ class ContactMessage(BaseModel):
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("password.verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with span("password.hash"):
+        return pwd_context.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -259,6 +407,7 @@ def file_to_dict(file: FileModel) -> Dict[str, Any]:
         "project_id": file.project_id,
         "name": file.name,
         "content": file.content,
+        "content_hash": file.content_hash,
         "file_type": file.file_type,
         "is_binary": file.is_binary,
         "created_at": _to_iso(file.created_at),
@@ -266,6 +415,15 @@ def file_to_dict(file: FileModel) -> Dict[str, Any]:
     }
 
 
+def project_file_to_dict(file: FileModel) -> Dict[str, Any]:
+    # Images are shown through their resized variants, so project listings leave the base64 body out.
+    file_data = file_to_dict(file)
+    if is_image_file(file_data):
+        file_data.pop("content")
+        file_data["content_omitted"] = True
+    return file_data
+
+
 def chat_message_to_dict(message: ChatMessage) -> Dict[str, Any]:
     return {
         "id": message.id,
@@ -276,6 +434,41 @@ def chat_message_to_dict(message: ChatMessage) -> Dict[str, Any]:
     }
 
 
+def _local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Chat timestamps are stored as naive local time, in the table and in the archive alike.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+async def load_chat_history(
+    session: AsyncSession, before: Optional[datetime], limit: int
+) -> Tuple[List[Dict[str, Any]], bool]:
+    # (messages oldest first, has_more). Recent messages come from the table; once it runs out,
+    # the rest come from the archive segments the retention job moved older days into.
+    before = _local_naive(before)
+    statement = select(ChatMessage).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1)
+    if before is not None:
+        statement = statement.where(ChatMessage.timestamp < before)
+    rows = list((await session.execute(statement)).scalars())
+    messages = [chat_message_to_dict(message) for message in rows]
+    cutoff = archive_cutoff()
+    if before is None and rows and len(rows) <= limit and cutoff is not None and rows[-1].timestamp >= cutoff:
+        # A first page that the table fills back to inside the retention window leaves older
+        # history for the next request; has_more only has to say whether the archive has any.
+        return messages[::-1], bool(await asyncio.to_thread(archived_days))
+    if len(messages) <= limit:
+        archived = await asyncio.to_thread(
+            read_archived_before,
+            before or datetime.now(),
+            limit + 1 - len(messages),
+            {message["id"] for message in messages},
+        )
+        if archived:
+            messages = sorted(messages + archived, key=lambda message: (message["timestamp"] or "", message["id"]), reverse=True)
+    return messages[:limit][::-1], len(messages) > limit
+
+
 async def ensure_db_connection(session: AsyncSession) -> None:
     try:
         await session.execute(text("SELECT 1"))
@@ -286,8 +479,19 @@ async def ensure_db_connection(session: AsyncSession) -> None:
         ) from exc
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)) -> Dict[str, Any]:
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
     await ensure_db_connection(session)
+    user = await get_user_from_token(token, session)
+    # Picked up by the access log.
+    request.state.user_id = user["id"]
+    return user
+
+
+async def get_user_from_token(token: str, session: AsyncSession) -> Dict[str, Any]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -335,16 +539,18 @@ def _compose_reset_email(code: str) -> Dict[str, str]:
 
 def _send_reset_email(email: str, message_data: Dict[str, str]) -> bool:
     if not SMTP_HOST:
-        print("SMTP host is not configured; skipping email send.")
+        email_logger.warning("SMTP host is not configured; skipping email send.")
+        EMAIL_MESSAGES.labels("smtp", "skipped").inc()
         return False
 
     sender = FROM_EMAIL or SMTP_USER
     if not sender:
-        print("No sender email configured; set FROM_EMAIL or SMTP_USER.")
+        email_logger.warning("No sender email configured; set FROM_EMAIL or SMTP_USER.")
+        EMAIL_MESSAGES.labels("smtp", "skipped").inc()
         return False
 
     if SMTP_USE_TLS and SMTP_USE_SSL:
-        print("Both SMTP_USE_TLS and SMTP_USE_SSL are enabled; defaulting to TLS only.")
+        email_logger.warning("Both SMTP_USE_TLS and SMTP_USE_SSL are enabled; defaulting to TLS only.")
 
     mime_message = MIMEMultipart("alternative")
     mime_message["Subject"] = message_data["subject"]
@@ -357,37 +563,44 @@ def _send_reset_email(email: str, message_data: Dict[str, str]) -> bool:
     smtp_class = smtplib.SMTP_SSL if (SMTP_USE_SSL and not SMTP_USE_TLS) else smtplib.SMTP
 
     try:
-        with smtp_class(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as server:
-            server.ehlo()
-            if SMTP_USE_TLS and smtp_class is smtplib.SMTP:
-                server.starttls()
+        with span("email.smtp", kind="client", **{"smtp.host": SMTP_HOST, "smtp.port": SMTP_PORT}):
+            with smtp_class(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as server:
                 server.ehlo()
-            if SMTP_USER and SMTP_PASSWORD:
-                server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(sender, [email], mime_message.as_string())
+                if SMTP_USE_TLS and smtp_class is smtplib.SMTP:
+                    server.starttls()
+                    server.ehlo()
+                if SMTP_USER and SMTP_PASSWORD:
+                    server.login(SMTP_USER, SMTP_PASSWORD)
+                server.sendmail(sender, [email], mime_message.as_string())
+        EMAIL_MESSAGES.labels("smtp", "sent").inc()
         return True
-    except Exception as exc:  # pragma: no cover - logging for runtime issues
-        print(f"Error sending email: {exc}")
+    except Exception:  # pragma: no cover - logging for runtime issues
+        email_logger.exception("Error sending email")
+        EMAIL_MESSAGES.labels("smtp", "failed").inc()
         return False
 
 
 async def send_reset_email(email: str, code: str) -> bool:
-    message_data = _compose_reset_email(code)
-
-    if FASTMAIL_CLIENT:
-        message = MessageSchema(
-            subject=message_data["subject"],
-            recipients=[email],
-            body=message_data["html"],
-            subtype=MessageType.html,
-        )
-        try:
-            await FASTMAIL_CLIENT.send_message(message)
-            return True
-        except Exception as exc:  # pragma: no cover - logging for runtime issues
-            print(f"FastMail send failed, falling back to SMTP: {exc}")
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _send_reset_email, email, message_data)
+    with span("email.send_reset"):
+        message_data = _compose_reset_email(code)
+
+        if FASTMAIL_CLIENT:
+            message = MessageSchema(
+                subject=message_data["subject"],
+                recipients=[email],
+                body=message_data["html"],
+                subtype=MessageType.html,
+            )
+            try:
+                with span("email.fastmail", kind="client"):
+                    await FASTMAIL_CLIENT.send_message(message)
+                EMAIL_MESSAGES.labels("fastmail", "sent").inc()
+                return True
+            except Exception:  # pragma: no cover - logging for runtime issues
+                email_logger.exception("FastMail send failed, falling back to SMTP")
+                EMAIL_MESSAGES.labels("fastmail", "failed").inc()
+        # to_thread copies the context, so the SMTP span stays in this trace.
+        return await asyncio.to_thread(_send_reset_email, email, message_data)
 
 
 @app.on_event("startup")
@@ -552,68 +765,236 @@ async def reset_password(reset: PasswordReset, session: AsyncSession = Depends(g
 
 @app.get("/api/projects")
 async def get_projects(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    created_by: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: Dict[str, Any] = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ) -> List[Dict[str, Any]]:
     await ensure_db_connection(session)
 
-    result = await session.execute(select(Project))
-    projects = [project_to_dict(project) for project in result.scalars().all()]
-    return projects
+    statement = select(Project)
+    if q:
+        statement = statement.where(Project.name.ilike(f"%{q}%"))
+    if created_by:
+        statement = statement.where(Project.created_by == created_by)
+    return await paginate(
+        session,
+        statement,
+        page,
+        {"created_at": Project.created_at, "name": Project.name},
+        "created_at",
+        Project.id,
+        request,
+        response,
+        project_to_dict,
+    )
+
+
+def project_etag(project: Project, file_versions: List[Tuple[str, Optional[datetime], Optional[str]]]) -> str:
+    # file_versions are (id, updated_at, content_hash) sorted by id; projects have no updated_at,
+    # so their own editable fields go in directly.
+    parts: List[Any] = [project.id, project.name, project.description, project.created_by, _to_iso(project.created_at)]
+    for file_id, updated_at, content_hash in file_versions:
+        parts.extend((file_id, _to_iso(updated_at), content_hash))
+    return weak_etag(*parts)
+
+
+def file_etag(file_id: str, updated_at: Optional[datetime], content_hash: Optional[str]) -> str:
+    return weak_etag(file_id, _to_iso(updated_at), content_hash)
+
+
+async def current_project_etag(session: AsyncSession, project_id: str) -> Optional[str]:
+    # Answers If-None-Match on a cache miss from the version columns alone; File.content is not read.
+    project = await session.get(Project, project_id)
+    if not project:
+        return None
+    result = await session.execute(
+        select(FileModel.id, FileModel.updated_at, FileModel.content_hash)
+        .where(FileModel.project_id == project_id)
+        .order_by(FileModel.id)
+    )
+    return project_etag(project, [tuple(row) for row in result.all()])
+
+
+def cached_json_response(request: Request, entry: CacheEntry) -> Response:
+    if entry.etag and etag_matches(request, entry.etag):
+        return not_modified(entry.etag)
+    headers = {"Cache-Control": PRIVATE_REVALIDATE_CACHE_CONTROL}
+    if entry.etag:
+        headers["ETag"] = entry.etag
+    return Response(content=entry.value, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+async def load_project_detail(project_id: str) -> CacheEntry:
+    # Shared by every concurrent reader of the project, so it uses its own session (the request
+    # that started it may disconnect first) and returns the serialized body, not the dict.
+    generation = project_cache.generation
+    async with async_session_factory() as session:
+        project = await session.get(Project, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+        result = await session.execute(select(FileModel).where(FileModel.project_id == project_id))
+        file_objs = result.scalars().all()
+
+    project_data = project_to_dict(project)
+    project_data["files"] = [project_file_to_dict(file) for file in file_objs]
+    version = max([project.created_at] + [file.updated_at for file in file_objs if file.updated_at])
+    etag = project_etag(
+        project, sorted((file.id, file.updated_at, file.content_hash) for file in file_objs)
+    )
+    entry = CacheEntry(json_body(project_data), _to_iso(version), etag=etag)
+    project_cache.put(project_id, entry, generation)
+    return entry
 
 
 @app.get("/api/projects/{project_id}")
 async def get_project(
     project_id: str,
+    request: Request,
     current_user: Dict[str, Any] = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
-) -> Dict[str, Any]:
+) -> Response:
+    entry = project_cache.get(project_id)
+    if entry is None:
+        if request.headers.get("if-none-match"):
+            etag = await current_project_etag(session, project_id)
+            if etag and etag_matches(request, etag):
+                return not_modified(etag)
+        entry = await project_reads.do(project_id, lambda: load_project_detail(project_id))
+    return cached_json_response(request, entry)
+
+
+@app.get("/api/projects/{project_id}/events")
+async def project_events(
+    project_id: str,
+    request: Request,
+    token: str,
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    # EventSource cannot send an Authorization header, so the token comes in the query like the chat socket.
     await ensure_db_connection(session)
+    await get_user_from_token(token, session)
 
     project = await session.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    await session.close()
 
-    result = await session.execute(select(FileModel).where(FileModel.project_id == project_id))
-    files = [file_to_dict(file) for file in result.scalars().all()]
+    return StreamingResponse(
+        change_feed.stream(project_id, request.headers.get("last-event-id"), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    project_data = project_to_dict(project)
-    project_data["files"] = files
-    return project_data
 
 
+@app.get("/api/projects/{project_id}/export")
+async def export_project(
+    project_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    await ensure_db_connection(session)
 
-@app.post("/api/projects")
-async def create_project(
-    project: ProjectCreate,
+    project = await session.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    filename = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in project.name) or "project"
+    return StreamingResponse(
+        iter_project_archive(project),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'},
+    )
+
+
+@app.post("/api/projects/import")
+async def import_project(
+    file: UploadFile = File(...),
+    name: Optional[str] = Form(None),
+    description: Optional[str] = Form(None),
     current_user: Dict[str, Any] = Depends(get_current_admin),
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, Any]:
     await ensure_db_connection(session)
-    project_id = str(uuid.uuid4())
+
+    try:
+        manifest, entries = await run_in_threadpool(read_project_archive, file.file)
+    except ArchiveError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    now = datetime.now()
+    project_obj = Project(
+        id=str(uuid.uuid4()),
+        name=name or manifest.get("name") or (file.filename or "Imported project").rsplit(".", 1)[0],
+        description=description if description is not None else manifest.get("description", ""),
+        created_by=current_user["id"],
+        created_at=now,
+    )
+    session.add(project_obj)
+    await session.flush()
+
+    file_rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "project_id": project_obj.id,
+            "name": entry_name,
+            "content": content,
+            "content_hash": compute_content_hash(content),
+            "file_type": file_type,
+            "is_binary": is_binary,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for entry_name, content, file_type, is_binary in entries
+    ]
+    if file_rows:
+        await session.execute(insert(FileModel), file_rows)
+        await session.execute(insert(FileRevision), initial_revision_rows(file_rows, current_user["id"]))
+    await index_project(session, project_obj)
+    for row in file_rows:
+        await index_file(session, FileModel(**row))
+    await session.commit()
+
+    project_data = project_to_dict(project_obj)
+    project_data["files"] = [
+        {key: value for key, value in file_to_dict(FileModel(**row)).items() if key != "content"}
+        for row in file_rows
+    ]
+    return project_data
+
+
+# The stage_* helpers apply one mutation to the session without committing, so a
+# single endpoint and /api/batch share them; feed events go out after the commit.
+async def stage_create_project(
+    session: AsyncSession,
+    project: ProjectCreate,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
     project_obj = Project(
-        id=project_id,
+        id=str(uuid.uuid4()),
         name=project.name,
         description=project.description,
         created_by=current_user["id"],
         created_at=datetime.now(),
     )
     session.add(project_obj)
-    await session.commit()
-
+    await index_project(session, project_obj)
     return project_to_dict(project_obj)
 
 
-
-@app.put("/api/projects/{project_id}")
-async def update_project(
+async def stage_update_project(
+    session: AsyncSession,
     project_id: str,
     project: ProjectUpdate,
-    current_user: Dict[str, Any] = Depends(get_current_admin),
-    session: AsyncSession = Depends(get_session),
+    current_user: Dict[str, Any],
+    events: FeedEvents,
 ) -> Dict[str, Any]:
-    await ensure_db_connection(session)
-
     project_obj = await session.get(Project, project_id)
     if not project_obj:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -623,11 +1004,59 @@ async def update_project(
 
     for key, value in update_data.items():
         setattr(project_obj, key, value)
+    await index_project(session, project_obj)
+
+    project_data = project_to_dict(project_obj)
+    events.append((project_id, "project_updated", project_data))
+    return project_data
+
+
+async def stage_delete_project(
+    session: AsyncSession,
+    project_id: str,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
+    project_obj = await session.get(Project, project_id)
+    if not project_obj:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_file_ids = select(FileModel.id).where(FileModel.project_id == project_id)
+    await session.execute(delete(FileRevision).where(FileRevision.file_id.in_(project_file_ids)))
+    await session.execute(delete(FileModel).where(FileModel.project_id == project_id))
+    await remove_project(session, project_id)
+    await session.delete(project_obj)
+    events.append((project_id, "project_deleted", {"id": project_id}))
+    return {"id": project_id, "message": "Project deleted"}
+
 
+@app.post("/api/projects")
+async def create_project(
+    project: ProjectCreate,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+    events: FeedEvents = []
+    project_data = await stage_create_project(session, project, current_user, events)
     await session.commit()
-    await session.refresh(project_obj)
+    publish_events(events)
+    return project_data
 
-    return project_to_dict(project_obj)
+
+@app.put("/api/projects/{project_id}")
+async def update_project(
+    project_id: str,
+    project: ProjectUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+    events: FeedEvents = []
+    project_data = await stage_update_project(session, project_id, project, current_user, events)
+    await session.commit()
+    publish_events(events)
+    return project_data
 
 
 @app.delete("/api/projects/{project_id}")
@@ -637,33 +1066,40 @@ async def delete_project(
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, str]:
     await ensure_db_connection(session)
-
-    project_obj = await session.get(Project, project_id)
-    if not project_obj:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    await session.execute(delete(FileModel).where(FileModel.project_id == project_id))
-    await session.delete(project_obj)
+    events: FeedEvents = []
+    await stage_delete_project(session, project_id, current_user, events)
     await session.commit()
-    
+    publish_events(events)
     return {"message": "Project deleted"}
 
 
-@app.post("/api/files")
-async def create_file(
-    file: FileCreate,
-    current_user: Dict[str, Any] = Depends(get_current_admin),
+@app.get("/api/search")
+async def search_projects(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, Any]:
     await ensure_db_connection(session)
+    if not search_index_ready():
+        raise HTTPException(status_code=503, detail="Search is not available")
+    return await run_search(session, q, limit, offset, project_id)
 
+
+async def stage_create_file(
+    session: AsyncSession,
+    file: FileCreate,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
     project_obj = await session.get(Project, file.project_id)
     if not project_obj:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    file_id = str(uuid.uuid4())
     file_obj = FileModel(
-        id=file_id,
+        id=str(uuid.uuid4()),
         project_id=file.project_id,
         name=file.name,
         content=file.content,
@@ -673,9 +1109,74 @@ async def create_file(
         updated_at=datetime.now(),
     )
     session.add(file_obj)
-    await session.commit()
+    await record_revision(session, file_obj, current_user["id"])
+    await index_file(session, file_obj)
+
+    file_data = file_to_dict(file_obj)
+    events.append((file_obj.project_id, "file_created", file_event_payload(file_data)))
+    return file_data
+
+
+async def stage_update_file(
+    session: AsyncSession,
+    file_id: str,
+    file: FileUpdate,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
+    # Locked before the read, so previous_content is what the next revision is diffed against.
+    await lock_file(session, file_id)
+    file_obj = await session.get(FileModel, file_id, populate_existing=True)
+    if not file_obj:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    update_data = {k: v for k, v in file.dict().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    previous_content = file_obj.content
+    for key, value in update_data.items():
+        setattr(file_obj, key, value)
+    file_obj.updated_at = datetime.now()
+    if file_obj.content != previous_content:
+        await record_revision(session, file_obj, current_user["id"], previous_content)
+    await index_file(session, file_obj)
+
+    file_data = file_to_dict(file_obj)
+    events.append((file_obj.project_id, "file_updated", file_event_payload(file_data)))
+    return file_data
+
+
+async def stage_delete_file(
+    session: AsyncSession,
+    file_id: str,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
+    file_obj = await session.get(FileModel, file_id)
+    if not file_obj:
+        raise HTTPException(status_code=404, detail="File not found")
 
-    return file_to_dict(file_obj)
+    project_id = file_obj.project_id
+    await session.execute(delete(FileRevision).where(FileRevision.file_id == file_id))
+    await remove_file(session, file_id)
+    await session.delete(file_obj)
+    events.append((project_id, "file_deleted", {"id": file_id, "project_id": project_id}))
+    return {"id": file_id, "message": "File deleted"}
+
+
+@app.post("/api/files")
+async def create_file(
+    file: FileCreate,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+    events: FeedEvents = []
+    file_data = await stage_create_file(session, file, current_user, events)
+    await session.commit()
+    publish_events(events)
+    return file_data
 
 
 @app.post("/api/files/upload")
@@ -687,30 +1188,8 @@ async def upload_file(
 ) -> Dict[str, Any]:
     await ensure_db_connection(session)
     content = await file.read()
-    file_type = file.filename.split(".")[-1] if "." in file.filename else "txt"
-
-    if file_type in [
-        "png",
-        "jpg",
-        "jpeg",
-        "gif",
-        "webp",
-        "mp4",
-        "avi",
-        "mov",
-        "webm",
-        "ico",
-    ]:
-        content_str = base64.b64encode(content).decode("utf-8")
-        is_binary = True
-    else:
-        try:
-            content_str = content.decode("utf-8")
-            is_binary = False
-        except UnicodeDecodeError:
-            content_str = base64.b64encode(content).decode("utf-8")
-            is_binary = True
-    
+    content_str, file_type, is_binary = decode_upload(file.filename, content)
+
     file_id = str(uuid.uuid4())
     now = datetime.now()
     file_obj = FileModel(
@@ -724,23 +1203,99 @@ async def upload_file(
         updated_at=now,
     )
     session.add(file_obj)
+    await record_revision(session, file_obj, current_user["id"])
+    await index_file(session, file_obj)
     await session.commit()
 
-    return file_to_dict(file_obj)
+    file_data = file_to_dict(file_obj)
+    publish_events([(project_id, "file_created", file_event_payload(file_data))])
+    return file_data
+
+
+@app.post("/api/files/upload/bulk")
+async def upload_files(
+    project_id: str = Form(...),
+    files: List[UploadFile] = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+
+    if len(files) > BULK_UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_UPLOAD_MAX_FILES} files per request")
+    project_obj = await session.get(Project, project_id)
+    if not project_obj:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    decoded = await decode_uploads(files)
+
+    now = datetime.now()
+    file_rows: List[Dict[str, Any]] = []
+    results: List[Dict[str, Any]] = []
+    for entry in decoded:
+        if "error" in entry:
+            results.append({"name": entry["name"], "status": "error", "detail": entry["error"]})
+            continue
+        row = {**entry, "id": str(uuid.uuid4()), "project_id": project_id, "created_at": now, "updated_at": now}
+        file_rows.append(row)
+        results.append({"name": entry["name"], "status": "created", "row": row})
+
+    if file_rows:
+        await session.execute(insert(FileModel), file_rows)
+        await session.execute(insert(FileRevision), initial_revision_rows(file_rows, current_user["id"]))
+        for row in file_rows:
+            await index_file(session, FileModel(**row))
+        await session.commit()
+
+    events: FeedEvents = []
+    for result in results:
+        row = result.pop("row", None)
+        if row is not None:
+            payload = file_event_payload(file_to_dict(FileModel(**row)))
+            events.append((project_id, "file_created", payload))
+            result["file"] = payload
+    publish_events(events)
+
+    return {
+        "project_id": project_id,
+        "created": len(file_rows),
+        "failed": len(results) - len(file_rows),
+        "results": results,
+    }
 
 
 @app.get("/api/files/{file_id}")
 async def get_file(
     file_id: str,
+    request: Request,
     current_user: Dict[str, Any] = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
-) -> Dict[str, Any]:
-    await ensure_db_connection(session)
-
-    file_obj = await session.get(FileModel, file_id)
-    if not file_obj:
-        raise HTTPException(status_code=404, detail="File not found")
-    return file_to_dict(file_obj)
+) -> Response:
+    entry = file_cache.get(file_id)
+    if entry is None:
+        if request.headers.get("if-none-match"):
+            result = await session.execute(
+                select(FileModel.updated_at, FileModel.content_hash).where(FileModel.id == file_id)
+            )
+            versions = result.first()
+            if versions is not None:
+                etag = file_etag(file_id, *versions)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+
+        generation = file_cache.generation
+        file_obj = await session.get(FileModel, file_id)
+        if not file_obj:
+            raise HTTPException(status_code=404, detail="File not found")
+        # Tagged with the project so deleting the project drops its files in one sweep.
+        entry = CacheEntry(
+            json_body(file_to_dict(file_obj)),
+            _to_iso(file_obj.updated_at),
+            file_obj.project_id,
+            file_etag(file_obj.id, file_obj.updated_at, file_obj.content_hash),
+        )
+        file_cache.put(file_id, entry, generation)
+    return cached_json_response(request, entry)
 
 
 @app.put("/api/files/{file_id}")
@@ -751,23 +1306,220 @@ async def update_file(
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, Any]:
     await ensure_db_connection(session)
+    events: FeedEvents = []
+    file_data = await stage_update_file(session, file_id, file, current_user, events)
+    await session.commit()
+    publish_events(events)
+    return file_data
 
-    file_obj = await session.get(FileModel, file_id)
+
+@app.patch("/api/files/{file_id}")
+async def patch_file(
+    file_id: str,
+    patch: FilePatch,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+
+    if (patch.edits is None) == (patch.diff is None):
+        raise HTTPException(status_code=400, detail="Provide either edits or diff")
+
+    # The hash check and the write must see the same row: with the lock taken first, a second
+    # patch against the same base waits here and then fails the check instead of overwriting.
+    await lock_file(session, file_id)
+    file_obj = await session.get(FileModel, file_id, populate_existing=True)
     if not file_obj:
         raise HTTPException(status_code=404, detail="File not found")
+    if file_obj.is_binary:
+        raise HTTPException(status_code=400, detail="Binary files cannot be patched")
+    if patch.base_hash != file_obj.content_hash:
+        raise HTTPException(
+            status_code=409,
+            detail="File has changed since the base version",
+            headers={"X-Content-Hash": file_obj.content_hash or ""},
+        )
 
-    update_data = {k: v for k, v in file.dict().items() if v is not None}
-    if not update_data:
-        raise HTTPException(status_code=400, detail="No fields to update")
-
-    for key, value in update_data.items():
-        setattr(file_obj, key, value)
+    base_hash = file_obj.content_hash
+    try:
+        if patch.diff is not None:
+            edits = unified_diff_to_range_edits(file_obj.content, patch.diff)
+        else:
+            edits = [(edit.start, edit.end, edit.text) for edit in patch.edits]
+        new_content = apply_range_edits(file_obj.content, edits)
+    except PatchError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+    name_changed = patch.name is not None and patch.name != file_obj.name
+    if new_content == file_obj.content and not name_changed:
+        return file_to_dict(file_obj)
+
+    if new_content != file_obj.content:
+        previous_content = file_obj.content
+        file_obj.content = new_content
+        await record_revision(session, file_obj, current_user["id"], previous_content, edits)
+    if name_changed:
+        file_obj.name = patch.name
     file_obj.updated_at = datetime.now()
+    await index_file(session, file_obj)
 
     await session.commit()
-    await session.refresh(file_obj)
 
-    return file_to_dict(file_obj)
+    file_data = file_to_dict(file_obj)
+    publish_events([(file_obj.project_id, "file_patched", patch_event_payload(file_data, base_hash, edits))])
+    return file_data
+
+
+async def load_rendered_file(file_id: str, fmt: str, language: str) -> CacheEntry:
+    async with async_session_factory() as session:
+        result = await session.execute(select(FileModel.content, FileModel.content_hash).where(FileModel.id == file_id))
+        row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    content, content_hash = row
+    content_hash = content_hash or compute_content_hash(content)
+    # Markdown parsing and highlighting are CPU-bound; keep them off the event loop.
+    rendered = await run_in_threadpool(render_html, content, fmt, language)
+    key = (content_hash, fmt, language)
+    entry = CacheEntry(
+        json_body({"content_hash": content_hash, "format": fmt, "language": language, "html": rendered}),
+        etag=weak_etag(RENDERER_VERSION, *key),
+    )
+    render_cache.put(key, entry, render_cache.generation)
+    return entry
+
+
+@app.get("/api/files/{file_id}/rendered")
+async def get_rendered_file(
+    file_id: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    result = await session.execute(
+        select(FileModel.name, FileModel.file_type, FileModel.is_binary, FileModel.content_hash, func.length(FileModel.content))
+        .where(FileModel.id == file_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    name, file_type, is_binary, content_hash, length = row
+    if is_binary:
+        raise HTTPException(status_code=415, detail="Binary files cannot be rendered")
+    if length and length > RENDER_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"Files over {RENDER_MAX_CHARS} characters are not rendered")
+
+    fmt, language = render_target(file_type, name)
+    if content_hash:
+        key = (content_hash, fmt, language)
+        etag = weak_etag(RENDERER_VERSION, *key)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        entry = render_cache.get(key)
+        if entry is None:
+            entry = await render_reads.do(key, lambda: load_rendered_file(file_id, fmt, language))
+    else:
+        entry = await load_rendered_file(file_id, fmt, language)
+    return cached_json_response(request, entry)
+
+
+@app.get("/api/files/{file_id}/thumb")
+async def get_file_thumbnail(
+    file_id: str,
+    request: Request,
+    variant: str = "thumb",
+    v: Optional[str] = None,
+    token: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    # <img> cannot send an Authorization header, so the token may also come in the query.
+    authorization = request.headers.get("authorization", "")
+    token = token or (authorization[7:] if authorization.lower().startswith("bearer ") else None)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    await get_user_from_token(token, session)
+
+    if variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variant must be one of: {', '.join(IMAGE_VARIANTS)}")
+    result = await session.execute(
+        select(FileModel.file_type, FileModel.is_binary, FileModel.content_hash).where(FileModel.id == file_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    file_type, is_binary, content_hash = row
+    if not is_image_file({"file_type": file_type, "is_binary": is_binary}) or not content_hash:
+        raise HTTPException(status_code=415, detail="File is not an image")
+
+    # ?v= pins the URL to one version of the file; only then may the browser keep it for good.
+    cache_control = DERIVATIVE_CACHE_CONTROL if v == content_hash else PRIVATE_REVALIDATE_CACHE_CONTROL
+    headers = {"ETag": f'"{content_hash}-{variant}"', "Cache-Control": cache_control}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    derivative = await load_derivative(session, content_hash, variant)
+    if derivative is None:
+        # Uploaded before the pipeline existed, or the background job has not finished yet.
+        await image_pipeline.ensure(file_id, content_hash)
+        derivative = await load_derivative(session, content_hash, variant)
+    if derivative is None:
+        raise HTTPException(status_code=415, detail="Image could not be processed")
+    return Response(content=derivative.data, media_type=derivative.media_type, headers=headers)
+
+
+@app.get("/api/render/highlight.css", include_in_schema=False)
+async def get_highlight_css(request: Request) -> Response:
+    css, etag = highlight_css()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=css, media_type="text/css", headers=headers)
+
+
+@app.get("/api/files/{file_id}/revisions")
+async def get_file_revisions(
+    file_id: str,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> List[Dict[str, Any]]:
+    await ensure_db_connection(session)
+
+    if await session.scalar(select(FileModel.id).where(FileModel.id == file_id)) is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return await paginate(
+        session,
+        revisions_statement(file_id),
+        page,
+        {"revision": FileRevision.revision, "created_at": FileRevision.created_at},
+        "revision",
+        FileRevision.id,
+        request,
+        response,
+        revision_to_dict,
+    )
+
+
+@app.get("/api/files/{file_id}/revisions/{revision}")
+async def get_file_revision(
+    file_id: str,
+    revision: int,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+
+    reconstructed = await reconstruct_revision(session, file_id, revision)
+    if reconstructed is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    revision_obj, content = reconstructed
+    revision_data = revision_to_dict(revision_obj)
+    revision_data["content"] = content
+    return revision_data
 
 
 @app.delete("/api/files/{file_id}")
@@ -777,49 +1529,120 @@ async def delete_file(
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, str]:
     await ensure_db_connection(session)
-
-    file_obj = await session.get(FileModel, file_id)
-    if not file_obj:
-        raise HTTPException(status_code=404, detail="File not found")
-
-    await session.delete(file_obj)
+    events: FeedEvents = []
+    await stage_delete_file(session, file_id, current_user, events)
     await session.commit()
-
+    publish_events(events)
     return {"message": "File deleted"}
 
 
 @app.get("/api/admin/users")
 async def get_users(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    role: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: Dict[str, Any] = Depends(get_current_admin),
     session: AsyncSession = Depends(get_session),
 ) -> List[Dict[str, Any]]:
     await ensure_db_connection(session)
 
-    result = await session.execute(select(User))
-    return [user_to_public_dict(user) for user in result.scalars().all()]
+    statement = select(User)
+    if q:
+        statement = statement.where(or_(User.username.ilike(f"%{q}%"), User.email.ilike(f"%{q}%")))
+    if role:
+        statement = statement.where(User.role == role)
+    return await paginate(
+        session,
+        statement,
+        page,
+        {"created_at": User.created_at, "name": User.username},
+        "created_at",
+        User.id,
+        request,
+        response,
+        user_to_public_dict,
+    )
+
+
+def reset_request_to_dict(reset: AdminResetRequest) -> Dict[str, Any]:
+    return {
+        "id": reset.id,
+        "user_id": reset.user_id,
+        "username": reset.username,
+        "status": reset.status,
+        "requested_at": _to_iso(reset.requested_at),
+        "completed_at": _to_iso(reset.completed_at),
+    }
 
 
 @app.get("/api/admin/reset-requests")
 async def get_reset_requests(
+    request: Request,
+    response: Response,
+    status_filter: str = Query("pending", alias="status"),
+    username: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: Dict[str, Any] = Depends(get_current_admin),
     session: AsyncSession = Depends(get_session),
 ) -> List[Dict[str, Any]]:
     await ensure_db_connection(session)
 
-    result = await session.execute(
-        select(AdminResetRequest).where(AdminResetRequest.status == "pending")
+    statement = select(AdminResetRequest).where(AdminResetRequest.status == status_filter)
+    if username:
+        statement = statement.where(AdminResetRequest.username == username)
+    return await paginate(
+        session,
+        statement,
+        page,
+        {"created_at": AdminResetRequest.requested_at, "name": AdminResetRequest.username},
+        "created_at",
+        AdminResetRequest.id,
+        request,
+        response,
+        reset_request_to_dict,
+    )
+
+
+@app.get("/api/admin/export/users")
+async def export_users(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+) -> StreamingResponse:
+    statement = select(User.__table__)
+    return stream_json_response(statement, User.created_at, User.id, user_to_public_dict, wants_ndjson(request, format), "users")
+
+
+@app.get("/api/admin/export/chat-messages")
+async def export_chat_messages(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+) -> StreamingResponse:
+    # Archived days go out first, straight from their segments. The table is only read past the
+    # last archived day: a day whose rows are still being deleted is already complete in its segment.
+    since, until = _local_naive(since), _local_naive(until)
+    days = await asyncio.to_thread(archived_days)
+    statement = select(ChatMessage.__table__)
+    if days:
+        statement = statement.where(ChatMessage.timestamp >= datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()))
+    if since:
+        statement = statement.where(ChatMessage.timestamp >= since)
+    if until:
+        statement = statement.where(ChatMessage.timestamp < until)
+    return stream_json_response(
+        statement,
+        ChatMessage.timestamp,
+        ChatMessage.id,
+        chat_message_to_dict,
+        wants_ndjson(request, format),
+        "chat_messages",
+        leading=iter_archived(days, since, until),
     )
-    requests = []
-    for reset in result.scalars().all():
-        requests.append({
-                "id": reset.id,
-                "user_id": reset.user_id,
-                "username": reset.username,
-                "status": reset.status,
-                "requested_at": _to_iso(reset.requested_at),
-                "completed_at": _to_iso(reset.completed_at)
-        })
-    return requests
 
 
 @app.post("/api/admin/reset-password/{user_id}")
@@ -848,6 +1671,37 @@ async def admin_reset_password(
     return {"message": f"Password reset to {new_password}"}
 
 
+@app.post("/api/admin/profile")
+async def profile_server(
+    seconds: float = Query(5.0, gt=0, le=PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    all_threads: bool = False,
+    include_idle: bool = False,
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+) -> Response:
+    try:
+        result = await run_profile(seconds, interval_ms, all_threads, include_idle)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    if format == "json":
+        stacks = [{"stack": stack, "count": count} for stack, count in result.pop("stacks").most_common()]
+        return JSONResponse({**result, "stacks": stacks})
+
+    lag = result["loop_lag"]
+    return Response(
+        collapsed_stacks(result["stacks"]),
+        media_type="text/plain",
+        headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Idle-Samples": str(result["idle_samples"]),
+            "X-Loop-Lag-P99-Ms": str(lag["p99_ms"]),
+            "X-Loop-Lag-Max-Ms": str(lag["max_ms"]),
+        },
+    )
+
+
 @app.put("/api/admin/users/{user_id}/role")
 async def update_user_role(
     user_id: str,
@@ -869,6 +1723,17 @@ async def update_user_role(
     return {"message": "Role updated"}
 
 
+@app.get("/api/chat/messages")
+async def get_chat_messages(
+    before: Optional[datetime] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    messages, has_more = await load_chat_history(session, before, limit)
+    return {"messages": messages, "has_more": has_more}
+
+
 @app.websocket("/api/ws/chat")
 async def websocket_chat(websocket: WebSocket, token: str) -> None:
     user = None
@@ -903,50 +1768,43 @@ async def websocket_chat(websocket: WebSocket, token: str) -> None:
             await manager.connect(websocket, user_id, user.username)
 
             # Отправляем историю
-            history_result = await session.execute(
-                select(ChatMessage)
-                .order_by(ChatMessage.timestamp.desc())
-                .limit(50)
-            )
-            messages = [
-                chat_message_to_dict(msg)
-                for msg in history_result.scalars().all()
-            ][::-1]
+            messages, has_more = await load_chat_history(session, None, 50)
 
             await websocket.send_json({
                 "type": "history",
-                "messages": messages
+                "messages": messages,
+                "has_more": has_more
             })
 
         # Основной цикл (создаем новую сессию для каждого сообщения)
         while True:
             data = await websocket.receive_json()
 
-            async with async_session_factory() as session:
-                message_id = str(uuid.uuid4())
-                chat_message = ChatMessage(
-                    id=message_id,
-                    user_id=user_id,
-                    username=user.username,
-                    message=data.get("message", ""),
-                    timestamp=datetime.now(),
-                )
-                session.add(chat_message)
-                await session.commit()
-
-                await manager.broadcast({
-                    "type": "message",
-                    "data": chat_message_to_dict(chat_message)
-                })
+            # One trace per chat message: the insert plus the fan-out to every connection.
+            with start_trace("WS chat.message", **{"ws.user_id": user_id}):
+                async with async_session_factory() as session:
+                    message_id = str(uuid.uuid4())
+                    chat_message = ChatMessage(
+                        id=message_id,
+                        user_id=user_id,
+                        username=user.username,
+                        message=data.get("message", ""),
+                        timestamp=datetime.now(),
+                    )
+                    session.add(chat_message)
+                    await session.commit()
+
+                    await manager.broadcast({
+                        "type": "message",
+                        "data": chat_message_to_dict(chat_message)
+                    })
 
     except WebSocketDisconnect:
         # Нормальное отключение клиента
         pass
 
-    except Exception as exc:
-        print(f"WebSocket error: {exc}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        chat_logger.exception("WebSocket error")
 
     finally:
         # Очистка при любом завершении
@@ -958,6 +1816,13 @@ async def websocket_chat(websocket: WebSocket, token: str) -> None:
                 await websocket.close(code=1000)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request) -> Response:
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/api/health")
 async def health() -> Dict[str, str]:
     return {"status": "ok"}
@@ -979,24 +1844,38 @@ def service_to_dict(service: Service) -> Dict[str, Any]:
 
 @app.get("/api/services")
 async def get_services(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
 ) -> List[Dict[str, Any]]:
     await ensure_db_connection(session)
-    result = await session.execute(select(Service))
-    services = [service_to_dict(service) for service in result.scalars().all()]
-    return services
 
+    statement = select(Service)
+    if q:
+        statement = statement.where(Service.name.ilike(f"%{q}%"))
+    return await paginate(
+        session,
+        statement,
+        page,
+        {"created_at": Service.created_at, "name": Service.name},
+        "created_at",
+        Service.id,
+        request,
+        response,
+        service_to_dict,
+    )
 
-@app.post("/api/services")
-async def create_service(
+
+async def stage_create_service(
+    session: AsyncSession,
     service: ServiceCreate,
-    current_user: Dict[str, Any] = Depends(get_current_admin),
-    session: AsyncSession = Depends(get_session),
+    current_user: Dict[str, Any],
+    events: FeedEvents,
 ) -> Dict[str, Any]:
-    await ensure_db_connection(session)
-    service_id = str(uuid.uuid4())
     service_obj = Service(
-        id=service_id,
+        id=str(uuid.uuid4()),
         name=service.name,
         description=service.description,
         price=service.price,
@@ -1007,35 +1886,69 @@ async def create_service(
         updated_at=datetime.now(),
     )
     session.add(service_obj)
-    await session.commit()
     return service_to_dict(service_obj)
 
 
-@app.put("/api/services/{service_id}")
-async def update_service(
+async def stage_update_service(
+    session: AsyncSession,
     service_id: str,
     service: ServiceUpdate,
-    current_user: Dict[str, Any] = Depends(get_current_admin),
-    session: AsyncSession = Depends(get_session),
+    current_user: Dict[str, Any],
+    events: FeedEvents,
 ) -> Dict[str, Any]:
-    await ensure_db_connection(session)
     service_obj = await session.get(Service, service_id)
     if not service_obj:
         raise HTTPException(status_code=404, detail="Service not found")
-    
+
     update_data = {k: v for k, v in service.dict().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
-    
+
     for key, value in update_data.items():
         setattr(service_obj, key, value)
     service_obj.updated_at = datetime.now()
-    
-    await session.commit()
-    await session.refresh(service_obj)
     return service_to_dict(service_obj)
 
 
+async def stage_delete_service(
+    session: AsyncSession,
+    service_id: str,
+    current_user: Dict[str, Any],
+    events: FeedEvents,
+) -> Dict[str, Any]:
+    service_obj = await session.get(Service, service_id)
+    if not service_obj:
+        raise HTTPException(status_code=404, detail="Service not found")
+
+    await session.delete(service_obj)
+    return {"id": service_id, "message": "Service deleted"}
+
+
+@app.post("/api/services")
+async def create_service(
+    service: ServiceCreate,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+    service_data = await stage_create_service(session, service, current_user, [])
+    await session.commit()
+    return service_data
+
+
+@app.put("/api/services/{service_id}")
+async def update_service(
+    service_id: str,
+    service: ServiceUpdate,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+    service_data = await stage_update_service(session, service_id, service, current_user, [])
+    await session.commit()
+    return service_data
+
+
 @app.delete("/api/services/{service_id}")
 async def delete_service(
     service_id: str,
@@ -1043,15 +1956,78 @@ async def delete_service(
     session: AsyncSession = Depends(get_session),
 ) -> Dict[str, str]:
     await ensure_db_connection(session)
-    service_obj = await session.get(Service, service_id)
-    if not service_obj:
-        raise HTTPException(status_code=404, detail="Service not found")
-    
-    await session.delete(service_obj)
+    await stage_delete_service(session, service_id, current_user, [])
     await session.commit()
     return {"message": "Service deleted"}
 
 
+# op -> (payload model, stage helper, whether the op targets an existing row by id)
+BATCH_HANDLERS = {
+    "create_project": (ProjectCreate, stage_create_project, False),
+    "update_project": (ProjectUpdate, stage_update_project, True),
+    "delete_project": (None, stage_delete_project, True),
+    "create_file": (FileCreate, stage_create_file, False),
+    "update_file": (FileUpdate, stage_update_file, True),
+    "delete_file": (None, stage_delete_file, True),
+    "create_service": (ServiceCreate, stage_create_service, False),
+    "update_service": (ServiceUpdate, stage_update_service, True),
+    "delete_service": (None, stage_delete_service, True),
+}
+
+
+@app.post("/api/batch")
+async def run_batch(
+    batch: BatchRequest,
+    current_user: Dict[str, Any] = Depends(get_current_admin),
+    session: AsyncSession = Depends(get_session),
+) -> Dict[str, Any]:
+    await ensure_db_connection(session)
+
+    if len(batch.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_OPERATIONS} operations per batch")
+
+    events: FeedEvents = []
+    refs: Dict[str, Dict[str, Any]] = {}
+    results: List[Dict[str, Any]] = []
+    for index, operation in enumerate(batch.operations):
+        model, stage, by_id = BATCH_HANDLERS[operation.op]
+        try:
+            args: List[Any] = []
+            if by_id:
+                target_id = resolve_references(operation.id, refs)
+                if not target_id:
+                    raise HTTPException(status_code=400, detail="Operation requires 'id'")
+                args.append(target_id)
+            if model is not None:
+                try:
+                    args.append(model(**resolve_references(operation.data, refs)))
+                except ValidationError as exc:
+                    raise HTTPException(status_code=422, detail=exc.errors(include_url=False)) from exc
+            result = await stage(session, *args, current_user, events)
+            # Flushing per step makes later steps (and session.get) see earlier rows.
+            await session.flush()
+        except HTTPException as exc:
+            await session.rollback()
+            raise HTTPException(
+                status_code=exc.status_code,
+                detail={"index": index, "op": operation.op, "detail": exc.detail},
+            ) from exc
+        except SQLAlchemyError as exc:
+            await session.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail={"index": index, "op": operation.op, "detail": "Database rejected the operation"},
+            ) from exc
+
+        if operation.ref:
+            refs[operation.ref] = result
+        results.append({"op": operation.op, "ref": operation.ref, "result": result})
+
+    await session.commit()
+    publish_events(events)
+    return {"results": results}
+
+
 @app.post("/api/contact")
 async def send_contact_message(contact: ContactMessage) -> Dict[str, Any]:
     if not SMTP_HOST:
@@ -1105,13 +2081,15 @@ Email: {contact.email}{phone_text}
             subtype=MessageType.html,
         )
         try:
-            await FASTMAIL_CLIENT.send_message(message)
+            with span("email.fastmail", kind="client"):
+                await FASTMAIL_CLIENT.send_message(message)
+            EMAIL_MESSAGES.labels("fastmail", "sent").inc()
             return {"success": True, "message": "Сообщение отправлено"}
-        except Exception as exc:
-            print(f"FastMail send failed, falling back to SMTP: {exc}")
+        except Exception:
+            email_logger.exception("FastMail send failed, falling back to SMTP")
+            EMAIL_MESSAGES.labels("fastmail", "failed").inc()
     
-    loop = asyncio.get_running_loop()
-    success = await loop.run_in_executor(None, _send_reset_email, sender, message_data)
+    success = await asyncio.to_thread(_send_reset_email, sender, message_data)
     
     if success:
         return {"success": True, "message": "Сообщение отправлено"}
@@ -1119,7 +2097,11 @@ Email: {contact.email}{phone_text}
         raise HTTPException(status_code=500, detail="Failed to send email")
 
 
+register_spa(app)
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # The app writes its own structured access log; uvicorn's would duplicate it.
+    uvicorn.run(app, host="0.0.0.0", port=8001, access_log=False)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from metrics import SINGLE_FLIGHT_CALLS
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution of the loader: the first caller
+    # starts it as a task and everyone who arrives before it finishes awaits that same task.
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "shared").inc()
+        else:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        # shield(): a caller that disconnects must not cancel the load the others are waiting on.
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved even if every caller has gone away.
+            task.exception()
+
+    def forget(self, key: Hashable) -> None:
+        # Called after a write commits: callers arriving from now on start a fresh load instead of
+        # joining one that may have read the old rows. Callers already waiting keep their result.
+        self._calls.pop(key, None)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from conditional import etag_matches
+from database import BASE_DIR, DEBUG
+
+FRONTEND_DIR = Path(os.getenv("FRONTEND_DIR", str(BASE_DIR.parent))).resolve()
+ASSETS_PREFIX = "/assets/"
+ENTRY_MODULE = "/assets/js/app.js"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# How long a rendered index.html is served before assets/ is walked again for changed files;
+# in debug mode every navigation rescans so edits show up immediately.
+ASSET_RESCAN_SECONDS = float(os.getenv("ASSET_RESCAN_SECONDS", "0" if DEBUG else "30"))
+
+static_logger = logging.getLogger("app.static")
+
+_IMPORT_RE = re.compile(
+    r"""^\s*(?:import|export)\s+(?:[\w*\s{},$]*?\s+from\s+)?['"]([^'"]+)['"]""",
+    re.MULTILINE,
+)
+_LOCAL_REF_RE = re.compile(r"""(\b(?:href|src)=")(/assets/[^"?#]+)(")""")
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class AssetManifest:
+    def __init__(self, root: Path, rescan_seconds: float = ASSET_RESCAN_SECONDS):
+        self.root = root
+        self.rescan_seconds = rescan_seconds
+        self._scanned_at = 0.0
+        self.assets_dir = root / "assets"
+        self._versions: Dict[str, Tuple[int, int, str]] = {}
+        self._imports: Dict[str, Tuple[str, List[str]]] = {}
+        self._index: Optional[Tuple[Tuple, bytes, str]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return (self.root / "index.html").is_file()
+
+    def resolve(self, url: str) -> Optional[Path]:
+        if not url.startswith(ASSETS_PREFIX):
+            return None
+        path = (self.root / url.lstrip("/")).resolve()
+        if not path.is_relative_to(self.assets_dir.resolve()) or not path.is_file():
+            return None
+        return path
+
+    def version(self, url: str) -> Optional[str]:
+        path = self.resolve(url)
+        if path is None:
+            self._versions.pop(url, None)
+            return None
+        stat = path.stat()
+        cached = self._versions.get(url)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = _hash_file(path)
+        self._versions[url] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def versioned_url(self, url: str) -> str:
+        version = self.version(url)
+        return f"{url}?v={version}" if version else url
+
+    def scan(self) -> Dict[str, str]:
+        versions: Dict[str, str] = {}
+        if not self.assets_dir.is_dir():
+            return versions
+        for path in sorted(self.assets_dir.rglob("*")):
+            if not path.is_file():
+                continue
+            url = "/" + path.relative_to(self.root).as_posix()
+            version = self.version(url)
+            if version:
+                versions[url] = version
+        return versions
+
+    def module_imports(self, url: str) -> List[str]:
+        version = self.version(url)
+        if version is None:
+            return []
+        cached = self._imports.get(url)
+        if cached and cached[0] == version:
+            return cached[1]
+        source = self.resolve(url).read_text(encoding="utf-8")
+        base = posixpath.dirname(url)
+        deps = []
+        for specifier in _IMPORT_RE.findall(source):
+            if specifier.startswith("."):
+                deps.append(posixpath.normpath(posixpath.join(base, specifier)))
+            elif specifier.startswith("/"):
+                deps.append(specifier)
+        self._imports[url] = (version, deps)
+        return deps
+
+    def module_graph(self, entry: str) -> List[str]:
+        ordered: List[str] = []
+        seen = set()
+        pending = [entry]
+        while pending:
+            url = pending.pop(0)
+            if url in seen or self.version(url) is None:
+                continue
+            seen.add(url)
+            ordered.append(url)
+            pending.extend(self.module_imports(url))
+        return ordered
+
+    def cached_index(self) -> Optional[Tuple[bytes, str]]:
+        # The last rendered index while it is fresh; None once a rescan is due.
+        if self._index is None or time.monotonic() - self._scanned_at >= self.rescan_seconds:
+            return None
+        return self._index[1], self._index[2]
+
+    def render_index(self) -> Tuple[bytes, str]:
+        # Walks and stats every asset, so callers on the event loop run it in a thread.
+        index_path = self.root / "index.html"
+        stat = index_path.stat()
+        versions = self.scan()
+        self._scanned_at = time.monotonic()
+        signature = (stat.st_mtime_ns, stat.st_size, tuple(sorted(versions.items())))
+        if self._index and self._index[0] == signature:
+            return self._index[1], self._index[2]
+
+        html = index_path.read_text(encoding="utf-8")
+        html = _LOCAL_REF_RE.sub(lambda m: m.group(1) + self.versioned_url(m.group(2)) + m.group(3), html)
+
+        import_map = {
+            "imports": {
+                url: f"{url}?v={version}"
+                for url, version in versions.items()
+                if url.endswith(".js")
+            }
+        }
+        preloads = "".join(
+            f'\n    <link rel="modulepreload" href="{self.versioned_url(url)}">'
+            for url in self.module_graph(ENTRY_MODULE)
+        )
+        head = (
+            "    <script>window.APP_CONFIG = window.APP_CONFIG || { API_URL: window.location.origin };</script>\n"
+            f'    <script type="importmap">{json.dumps(import_map)}</script>'
+            f"{preloads}\n"
+        )
+        html = html.replace("</head>", head + "</head>", 1)
+
+        body = html.encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self._index = (signature, body, etag)
+        return body, etag
+
+
+asset_manifest = AssetManifest(FRONTEND_DIR)
+
+
+def register_spa(app: FastAPI, manifest: AssetManifest = asset_manifest) -> None:
+    # Must be called after every API route: the SPA fallback matches all paths.
+    if not manifest.enabled:
+        static_logger.warning("Frontend not found in %s; SPA serving disabled.", manifest.root)
+        return
+    # Scanned once up front, so the first navigation is served from the cache.
+    manifest.render_index()
+
+    @app.get("/assets/{asset_path:path}", include_in_schema=False)
+    async def serve_asset(asset_path: str, request: Request) -> Response:
+        url = ASSETS_PREFIX + asset_path
+        path = manifest.resolve(url)
+        version = manifest.version(url) if path else None
+        if path is None or version is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+
+        etag = f'"{version}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL if request.query_params.get("v") == version else REVALIDATE_CACHE_CONTROL
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, headers=headers)
+
+    @app.get("/{full_path:path}", include_in_schema=False)
+    async def serve_index(full_path: str, request: Request) -> Response:
+        if full_path == "api" or full_path.startswith("api/"):
+            raise HTTPException(status_code=404, detail="Not Found")
+
+        body, etag = manifest.cached_index() or await run_in_threadpool(manifest.render_index)
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="text/html", headers=headers)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import Select
+
+from database import async_session_factory
+
+STREAM_BATCH_ROWS = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def wants_ndjson(request: Request, fmt: Optional[str]) -> bool:
+    if fmt:
+        return fmt == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def iter_json_rows(
+    statement: Select,
+    sort_column,
+    id_column,
+    to_dict: Callable[[Any], Dict[str, Any]],
+    ndjson: bool,
+    leading: Optional[AsyncIterator[Dict[str, Any]]] = None,
+) -> AsyncIterator[bytes]:
+    # Rows are read in keyset batches ordered by (sort_column, id_column) and flushed in
+    # ~64 KiB chunks, so memory stays flat no matter how many rows the query returns.
+    # Every batch uses its own short session: a slow client never holds a read transaction
+    # (and with it SQLite's lock) open for the whole download. Records from `leading`, already
+    # in output shape, are written before the rows.
+    separator = b"\n" if ndjson else b","
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    first = True
+
+    def append(item: Dict[str, Any]) -> None:
+        nonlocal first
+        if not ndjson and not first:
+            buffer.extend(separator)
+        buffer.extend(json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        if ndjson:
+            buffer.extend(separator)
+        first = False
+
+    if leading is not None:
+        async for item in leading:
+            append(item)
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+    ordered = statement.order_by(sort_column, id_column).limit(STREAM_BATCH_ROWS)
+    batch_statement = ordered
+    while True:
+        async with async_session_factory() as session:
+            rows = (await session.execute(batch_statement)).all()
+        for row in rows:
+            append(to_dict(row))
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if len(rows) < STREAM_BATCH_ROWS:
+            break
+        last_value, last_id = getattr(rows[-1], sort_column.key), getattr(rows[-1], id_column.key)
+        batch_statement = ordered.where(
+            or_(sort_column > last_value, and_(sort_column == last_value, id_column > last_id))
+        )
+    if not ndjson:
+        buffer += b"]"
+    if buffer:
+        yield bytes(buffer)
+
+
+def stream_json_response(
+    statement: Select,
+    sort_column,
+    id_column,
+    to_dict: Callable[[Any], Dict[str, Any]],
+    ndjson: bool,
+    filename: Optional[str] = None,
+    leading: Optional[AsyncIterator[Dict[str, Any]]] = None,
+) -> StreamingResponse:
+    headers = {}
+    if filename:
+        extension = "ndjson" if ndjson else "json"
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return StreamingResponse(
+        iter_json_rows(statement, sort_column, id_column, to_dict, ndjson, leading),
+        media_type=NDJSON_MEDIA_TYPE if ndjson else JSON_MEDIA_TYPE,
+        headers=headers,
+    )
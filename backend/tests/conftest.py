@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+# The engine and archive paths are read at import time, so the test database is chosen first.
+_TMP_DIR = Path(tempfile.mkdtemp(prefix="backend-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_TMP_DIR / 'test.db'}"
+os.environ["CHAT_ARCHIVE_DIR"] = str(_TMP_DIR / "chat_archive")
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ["ACCESS_LOG"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+import server  # noqa: E402
+from database import User, async_session_factory, init_models  # noqa: E402
+from search import init_search_index  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    await init_models()
+    await init_search_index()
+    admin_id = str(uuid.uuid4())
+    async with async_session_factory() as session:
+        session.add(User(id=admin_id, username=f"admin-{admin_id[:8]}", email=None, password_hash="-", role="admin"))
+        await session.commit()
+    token = server.create_access_token({"sub": admin_id})
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", headers={"Authorization": f"Bearer {token}"}
+    ) as http:
+        yield http
+
+
+@pytest.fixture
+async def project(client):
+    response = await client.post("/api/projects", json={"name": f"project-{uuid.uuid4().hex[:8]}"})
+    assert response.status_code == 200, response.text
+    return response.json()
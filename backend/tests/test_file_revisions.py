@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from database import async_session_factory, compute_content_hash
+from revisions import reconstruct_revision
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_file(client, project, content):
+    response = await client.post(
+        "/api/files",
+        json={"project_id": project["id"], "name": "notes.txt", "content": content, "file_type": "txt"},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_concurrent_patches_against_one_base_keep_a_single_winner(client, project):
+    file = await create_file(client, project, "0123456789")
+
+    async def patch(position):
+        return await client.patch(
+            f"/api/files/{file['id']}",
+            json={"base_hash": file["content_hash"], "edits": [{"start": position, "end": position + 1, "text": "X"}]},
+        )
+
+    responses = await asyncio.gather(*(patch(position) for position in range(4)))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 409, 409, 409]
+
+    winner = next(response.json() for response in responses if response.status_code == 200)
+    stored = (await client.get(f"/api/files/{file['id']}")).json()
+    assert stored["content"] == winner["content"]
+    assert stored["content"].count("X") == 1
+
+
+async def test_concurrent_updates_store_revisions_that_rebuild(client, project):
+    lines = [f"line {number}\n" for number in range(2000)]
+    file = await create_file(client, project, "".join(lines))
+
+    async def update(writer):
+        edited = list(lines)
+        edited[writer * 400] = f"edited by writer {writer}\n"
+        return await client.put(f"/api/files/{file['id']}", json={"content": "".join(edited)})
+
+    responses = await asyncio.gather(*(update(writer) for writer in range(4)))
+    assert all(response.status_code == 200 for response in responses)
+
+    history = (await client.get(f"/api/files/{file['id']}/revisions", params={"limit": 50})).json()
+    assert [revision["revision"] for revision in history] == [1, 2, 3, 4, 5]
+    async with async_session_factory() as session:
+        for revision in history:
+            _, content = await reconstruct_revision(session, file["id"], revision["revision"])
+            assert compute_content_hash(content) == revision["content_hash"]
+
+    latest = (await client.get(f"/api/files/{file['id']}")).json()
+    assert latest["content_hash"] == history[-1]["content_hash"]
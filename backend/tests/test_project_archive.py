@@ -0,0 +1,61 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from project_archive import MANIFEST_NAME
+
+pytestmark = pytest.mark.anyio
+
+BINARY = bytes(range(256)) * 8
+
+
+async def test_export_then_import_round_trips_files(client, project):
+    texts = {"README.md": "# Заголовок\n", "src/main.py": "print('hi')\n" * 500}
+    for name, content in texts.items():
+        response = await client.post(
+            "/api/files",
+            json={"project_id": project["id"], "name": name, "content": content, "file_type": name.rsplit(".", 1)[1]},
+        )
+        assert response.status_code == 200, response.text
+    response = await client.post(
+        "/api/files/upload",
+        data={"project_id": project["id"]},
+        files={"file": ("blob.bin", BINARY, "application/octet-stream")},
+    )
+    assert response.status_code == 200, response.text
+
+    exported = await client.get(f"/api/projects/{project['id']}/export")
+    assert exported.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(exported.content)) as archive:
+        assert sorted(archive.namelist()) == sorted([*texts, "blob.bin", MANIFEST_NAME])
+        assert archive.read("blob.bin") == BINARY
+
+    imported = await client.post(
+        "/api/projects/import",
+        files={"file": ("export.zip", exported.content, "application/zip")},
+    )
+    assert imported.status_code == 200, imported.text
+    imported_project = imported.json()
+    assert imported_project["name"] == project["name"]
+
+    reexported = await client.get(f"/api/projects/{imported_project['id']}/export")
+    with zipfile.ZipFile(io.BytesIO(exported.content)) as before, zipfile.ZipFile(io.BytesIO(reexported.content)) as after:
+        for name in [*texts, "blob.bin"]:
+            assert after.read(name) == before.read(name)
+        # Imported files share one created_at, so only the set of entries has to match.
+        manifest_files = [
+            sorted(json.loads(archive.read(MANIFEST_NAME))["files"], key=lambda entry: entry["name"])
+            for archive in (before, after)
+        ]
+        assert manifest_files[0] == manifest_files[1]
+
+
+async def test_import_rejects_a_manifest_that_is_not_an_object(client):
+    payload = io.BytesIO()
+    with zipfile.ZipFile(payload, "w") as archive:
+        archive.writestr(MANIFEST_NAME, "[]")
+        archive.writestr("a.txt", "a")
+    response = await client.post("/api/projects/import", files={"file": ("bad.zip", payload.getvalue(), "application/zip")})
+    assert response.status_code == 400
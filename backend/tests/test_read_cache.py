@@ -0,0 +1,22 @@
+from read_cache import CacheBudget, CacheEntry, LRUCache
+
+ENTRY = CacheEntry(b"").size
+
+
+def test_caches_share_one_budget_and_evict_the_least_recently_used_entry():
+    budget = CacheBudget(3 * ENTRY)
+    projects = LRUCache("test_projects", budget=budget)
+    files = LRUCache("test_files", budget=budget)
+
+    projects.put("a", CacheEntry(b""), projects.generation)
+    files.put("b", CacheEntry(b""), files.generation)
+    projects.put("c", CacheEntry(b""), projects.generation)
+    assert projects.get("a") is not None
+
+    files.put("d", CacheEntry(b""), files.generation)
+    assert budget.size == 3 * ENTRY
+    assert files.get("b") is None
+    assert projects.get("a") is not None and projects.get("c") is not None
+
+    projects.clear()
+    assert budget.size == files.size == ENTRY
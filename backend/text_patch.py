@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import re
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+# (start, end, text): replace base[start:end] with text; offsets are in characters (code points).
+RangeEdit = Tuple[int, int, str]
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _split_lines(value: str) -> List[str]:
+    # Only "\n" separates lines in a diff; str.splitlines would also split on \x0b, \u2028 and friends.
+    lines = [line + "\n" for line in value.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def normalize_range_edits(base: str, edits: List[RangeEdit]) -> List[RangeEdit]:
+    ordered = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+    position = 0
+    for start, end, _ in ordered:
+        if start < 0 or end < start or end > len(base):
+            raise PatchError(f"Edit range {start}:{end} is outside the base content")
+        if start < position:
+            raise PatchError("Edit ranges overlap")
+        position = end
+    return ordered
+
+
+def apply_range_edits(base: str, edits: List[RangeEdit]) -> str:
+    parts = []
+    position = 0
+    for start, end, replacement in normalize_range_edits(base, edits):
+        parts.append(base[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(base[position:])
+    return "".join(parts)
+
+
+def unified_diff_to_range_edits(base: str, diff: str) -> List[RangeEdit]:
+    line_offsets = [0]
+    for line in _split_lines(base):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    diff_lines = _split_lines(diff)
+    edits: List[RangeEdit] = []
+    index = 0
+    while index < len(diff_lines):
+        match = _HUNK_RE.match(diff_lines[index])
+        index += 1
+        if not match:
+            continue
+
+        old_start = int(match.group(1))
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        new_count = int(match.group(4)) if match.group(4) is not None else 1
+        # A zero-length old range means "insert after line old_start".
+        start_line = old_start if old_count == 0 else old_start - 1
+        if start_line < 0 or start_line >= len(line_offsets):
+            raise PatchError(f"Hunk at line {old_start} is outside the base content")
+
+        old_parts: List[str] = []
+        new_parts: List[str] = []
+        last_kind = ""
+        old_seen = new_seen = 0
+        while index < len(diff_lines) and (old_seen < old_count or new_seen < new_count or diff_lines[index].startswith("\\")):
+            line = diff_lines[index]
+            index += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" strips the newline of the line before it.
+                for kind, parts in ((" ", old_parts), ("-", old_parts), (" ", new_parts), ("+", new_parts)):
+                    if last_kind == kind and parts:
+                        parts[-1] = parts[-1].rstrip("\r\n")
+                continue
+            kind, body = (" ", line) if line in ("\n", "\r\n") else (line[:1], line[1:])
+            if kind == " ":
+                old_parts.append(body)
+                new_parts.append(body)
+                old_seen += 1
+                new_seen += 1
+            elif kind == "-":
+                old_parts.append(body)
+                old_seen += 1
+            elif kind == "+":
+                new_parts.append(body)
+                new_seen += 1
+            else:
+                raise PatchError(f"Malformed diff line in hunk at line {old_start}")
+            last_kind = kind
+        if old_seen != old_count or new_seen != new_count:
+            raise PatchError(f"Hunk at line {old_start} is truncated")
+
+        start = line_offsets[start_line]
+        old_text = "".join(old_parts)
+        if base[start:start + len(old_text)] != old_text:
+            raise PatchError(f"Hunk at line {old_start} does not match the base content")
+        edits.append((start, start + len(old_text), "".join(new_parts)))
+
+    if not edits:
+        raise PatchError("Diff contains no hunks")
+    return normalize_range_edits(base, edits)
+
+
+def compute_range_edits(old: str, new: str) -> List[RangeEdit]:
+    old_lines = _split_lines(old)
+    new_lines = _split_lines(new)
+    old_offsets = [0]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+    new_offsets = [0]
+    for line in new_lines:
+        new_offsets.append(new_offsets[-1] + len(line))
+
+    edits: List[RangeEdit] = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            edits.append((old_offsets[i1], old_offsets[i2], new[new_offsets[j1]:new_offsets[j2]]))
+    return edits
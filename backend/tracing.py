@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import BASE_DIR, add_query_observer, engine, statement_operation
+from metrics import TRACE_SPANS_DROPPED
+
+# "file" appends one JSON span per line to TRACE_FILE; "otlp" posts OTLP/HTTP JSON batches to
+# TRACE_OTLP_ENDPOINT. Anything else leaves tracing off, and then every span() is a no-op.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").strip().lower()
+TRACE_FILE = os.getenv("TRACE_FILE", str(BASE_DIR / "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "projects-backend")
+TRACE_SAMPLE_RATE = min(max(float(os.getenv("TRACE_SAMPLE_RATE", "1.0")), 0.0), 1.0)
+TRACING_ENABLED = TRACE_EXPORTER in {"file", "otlp"}
+TRACE_HEADERS = ["X-Trace-Id"] if TRACING_ENABLED else []
+
+TRACE_QUEUE_SIZE = 10000
+TRACE_EXPORT_BATCH = 512
+TRACE_EXPORT_INTERVAL = 1.0
+TRACE_MAX_STATEMENT = 500
+
+tracing_logger = logging.getLogger("app.tracing")
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# OTLP SpanKind values.
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "duration", "error", "_started")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    return random.getrandbits(size * 8).to_bytes(size, "big").hex()
+
+
+def current_trace_id() -> Optional[str]:
+    active = current_span.get()
+    return active.trace_id if active is not None else None
+
+
+def _parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    match = _TRACEPARENT_RE.match(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        span.duration = time.perf_counter() - span._started
+        current_span.reset(token)
+        _exporter.submit(span)
+
+
+@contextmanager
+def start_trace(name: str, kind: str = "server", traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    # Opens a root span; the sampling decision is made once here and children follow it.
+    if not TRACING_ENABLED:
+        yield None
+        return
+    parent = _parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = _new_id(16), None, random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        yield None
+        return
+    with _activate(Span(trace_id, parent_id, name, kind, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Optional[Span]]:
+    # Child spans only exist inside a sampled trace; anywhere else this costs one ContextVar read.
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(parent.trace_id, parent.span_id, name, kind, attributes)) as child:
+        yield child
+
+
+def record_span(name: str, duration: float, kind: str = "internal", **attributes: Any) -> None:
+    # For work that is only timed after the fact, like the statements reported by the engine hooks.
+    parent = current_span.get()
+    if parent is None:
+        return
+    finished = Span(parent.trace_id, parent.span_id, name, kind, attributes)
+    finished.start_ns -= int(duration * 1e9)
+    finished.duration = duration
+    _exporter.submit(finished)
+
+
+def _trace_query(statement: str, elapsed: float) -> None:
+    if current_span.get() is None:
+        return
+    operation = statement_operation(statement)
+    record_span(
+        f"db {operation}",
+        elapsed,
+        kind="client",
+        **{"db.system": engine.dialect.name, "db.operation": operation, "db.statement": statement[:TRACE_MAX_STATEMENT]},
+    )
+
+
+add_query_observer(_trace_query)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [
+                    {
+                        "traceId": item.trace_id,
+                        "spanId": item.span_id,
+                        "parentSpanId": item.parent_id or "",
+                        "name": item.name,
+                        "kind": _OTLP_KINDS.get(item.kind, 1),
+                        "startTimeUnixNano": str(item.start_ns),
+                        "endTimeUnixNano": str(item.start_ns + int(item.duration * 1e9)),
+                        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+                        "status": {"code": 2, "message": item.error} if item.error else {"code": 0},
+                    }
+                    for item in spans
+                ],
+            }],
+        }]
+    }
+
+
+class _SpanExporter:
+    # Finished spans go through a bounded queue to one thread that batches the writes or posts;
+    # request handlers never wait on the file or the collector.
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue(TRACE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def submit(self, finished: Span) -> None:
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            TRACE_SPANS_DROPPED.inc()
+
+    def start(self) -> None:
+        if not TRACING_ENABLED or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _drain(self, first: Optional[Span] = None) -> List[Span]:
+        batch = [first] if first is not None else []
+        while len(batch) < TRACE_EXPORT_BATCH:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=TRACE_EXPORT_INTERVAL)
+            except queue.Empty:
+                continue
+            self._export(self._drain(first))
+        # Flush what is left on shutdown.
+        batch = self._drain()
+        while batch:
+            self._export(batch)
+            batch = self._drain()
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            if TRACE_EXPORTER == "file":
+                with open(TRACE_FILE, "a", encoding="utf-8") as handle:
+                    handle.writelines(json.dumps(item.to_dict(), ensure_ascii=False, default=str) + "\n" for item in batch)
+            else:
+                body = json.dumps(otlp_payload(batch), default=str).encode("utf-8")
+                request = urllib.request.Request(
+                    TRACE_OTLP_ENDPOINT, data=body, headers={"Content-Type": "application/json"}, method="POST"
+                )
+                with urllib.request.urlopen(request, timeout=5):
+                    pass
+        except Exception as exc:
+            TRACE_SPANS_DROPPED.inc(len(batch))
+            tracing_logger.warning("Span export failed: %s", exc)
+
+
+_exporter = _SpanExporter()
+
+
+def start_tracing() -> None:
+    _exporter.start()
+
+
+def shutdown_tracing() -> None:
+    _exporter.stop()
+
+
+class TracingMiddleware:
+    # Opens the root span for each HTTP request; a W3C traceparent header continues the caller's trace.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        method = scope["method"]
+        with start_trace(f"{method} {scope['path']}", traceparent=traceparent, **{"http.method": method, "http.target": scope["path"]}) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        root.error = f"HTTP {message['status']}"
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", root.trace_id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.name = f"{method} {route}"
+                    root.set("http.route", route)